@@ -1,108 +1,250 @@
 # app.py
 import streamlit as st
-from utils import (
-    extract_from_pdf,
-    extract_from_excel,
-    normalize_financial_data,
-    simple_qa_answer,
-    build_document_summary_text,
-)
+from utils import simple_qa_answer, financials_frame, QA_METRICS
+from jobs import JobQueue, process_document, document_key, pdf_workers_per_job, configured_job_workers, JOB_WORKERS_ENV
+from metric_store import MetricStore
+from llm_client import OllamaClient, OllamaError, DEFAULT_URL, DEFAULT_READ_TIMEOUT, DEFAULT_NUM_PREDICT
+from llm_cache import ResponseCache, response_key, normalize_question, DEFAULT_DB_PATH
+from retrieval import chunk_document, select_context, DEFAULT_TOKEN_BUDGET
+from registry import DocumentRegistry
 import json
 import os
-import tempfile
-import requests
-
-st.set_page_config(page_title="Financial Doc Q&A Assistant", layout="wide")
-
-st.title("💬 Financial Document Q&A Assistant")
-
-# Sidebar - settings
-st.sidebar.header("Settings")
-use_ollama = st.sidebar.checkbox("Use local Ollama for natural answers (optional)", value=False)
-ollama_url = st.sidebar.text_input("Ollama URL (if enabled)", value="http://localhost:11434/api/generate")
-ollama_model = st.sidebar.text_input("Ollama model name", value="llama2")  # change as required
-
-uploaded_files = st.file_uploader("Upload PDF or Excel files (multiple allowed)", accept_multiple_files=True, type=["pdf","xls","xlsx"], help="Upload financial statements: Income statement, Balance sheet, Cash flow.")
-process_button = st.button("Process uploaded documents")
-
-if "extracted_data" not in st.session_state:
-    st.session_state["extracted_data"] = {}
-if "doc_texts" not in st.session_state:
-    st.session_state["doc_texts"] = {}
-if "convo" not in st.session_state:
-    st.session_state["convo"] = []
-
-if process_button:
-    if not uploaded_files:
-        st.warning("Please upload one or more PDF/Excel files first.")
-    else:
-        progress = st.progress(0)
-        total = len(uploaded_files)
-        all_financials = {}
-        doc_texts = {}
-        for i, uploaded in enumerate(uploaded_files):
-            fname = uploaded.name
-            suffix = fname.split(".")[-1].lower()
-            st.info(f"Processing {fname}...")
-            with tempfile.NamedTemporaryFile(delete=False, suffix="."+suffix) as tmp:
-                tmp.write(uploaded.getbuffer())
-                tmp_path = tmp.name
-            try:
-                if suffix == "pdf":
-                    text, tables = extract_from_pdf(tmp_path)
+import time
+
+# seconds between status checks while a batch is processing
+POLL_SECONDS = 1
+# size and lifetime of the per-document st.cache_data entries (keyed on content hashes)
+CACHE_MAX_ENTRIES = 256
+CACHE_TTL_SECONDS = 3600
+# st.rerun replaced st.experimental_rerun in newer Streamlit releases
+rerun = getattr(st, "rerun", None) or st.experimental_rerun
+
+@st.cache_resource
+def get_metric_store():
+    # one DuckDB store per server process, shared by every session
+    return MetricStore()
+
+@st.cache_resource
+def get_llm_client(url, model, read_timeout):
+    # pooled keep-alive session reused across reruns and sessions
+    return OllamaClient(url, model, read_timeout=read_timeout)
+
+@st.cache_resource
+def get_response_cache(persist):
+    return ResponseCache(db_path=DEFAULT_DB_PATH if persist else None)
+
+@st.cache_resource
+def get_job_queue():
+    # shared by every session, so concurrent batches from several users share one limit;
+    # it is a server setting rather than a sidebar widget, which each session would set
+    return JobQueue(configured_job_workers())
+
+@st.cache_data(max_entries=CACHE_MAX_ENTRIES, ttl=CACHE_TTL_SECONDS, show_spinner=False)
+def load_document_financials(doc_hash):
+    # a content hash always maps to the same metrics, so reruns skip the DuckDB query
+    return get_metric_store().load_financials({doc_hash: doc_hash})[doc_hash]
+
+@st.cache_data(max_entries=CACHE_MAX_ENTRIES, ttl=CACHE_TTL_SECONDS, show_spinner=False)
+def document_preview(doc_hash):
+    return financials_frame(load_document_financials(doc_hash))
+
+@st.cache_data(max_entries=CACHE_MAX_ENTRIES, ttl=CACHE_TTL_SECONDS, show_spinner=False)
+def document_chunks(doc_hash, fname, _text, _tables, _financials):
+    # underscore arguments are not hashed; doc_hash already identifies them
+    return chunk_document(fname, _text, _tables, _financials)
+
+def main():
+    st.set_page_config(page_title="Financial Doc Q&A Assistant", layout="wide")
+
+    st.title("💬 Financial Document Q&A Assistant")
+
+    metric_store = get_metric_store()
+
+    # Sidebar - settings
+    st.sidebar.header("Settings")
+    use_ollama = st.sidebar.checkbox("Use local Ollama for natural answers (optional)", value=False)
+    ollama_url = st.sidebar.text_input("Ollama URL (if enabled)", value=DEFAULT_URL)
+    ollama_model = st.sidebar.text_input("Ollama model name", value="llama2")  # change as required
+    ollama_timeout = st.sidebar.number_input("Ollama timeout between tokens (seconds)", min_value=5, max_value=600, value=DEFAULT_READ_TIMEOUT)
+    ollama_max_tokens = st.sidebar.number_input("Max answer tokens", min_value=16, max_value=4096, value=DEFAULT_NUM_PREDICT)
+    context_budget = st.sidebar.number_input("LLM context budget (tokens)", min_value=200, max_value=32000, value=DEFAULT_TOKEN_BUDGET, help="Only the most relevant text, table and metric chunks are sent to the model.")
+    use_embeddings = st.sidebar.checkbox("Re-rank context with Ollama embeddings", value=False)
+    embedding_model = st.sidebar.text_input("Ollama embedding model", value="nomic-embed-text")
+    persist_llm_cache = st.sidebar.checkbox("Keep cached Ollama answers on disk", value=True)
+    response_cache = get_response_cache(persist_llm_cache)
+    pdf_workers = st.sidebar.number_input("PDF extraction processes (1 = serial)", min_value=1, max_value=os.cpu_count() or 1, value=1, help="Large PDFs are split into page ranges extracted in parallel.")
+    pdf_fast_scan = st.sidebar.checkbox("PDF: fast scan (quick text for all pages, full layout analysis only on statement pages)", value=False, help="Uses pdfium for raw text; pages without a statement title or line items are not searched for tables.")
+    financial_sheets_only = st.sidebar.checkbox("Excel: fully load only sheets that look like financial statements", value=False, help="Sheets are judged by their name and first rows; other sheets are only previewed, so metrics further down them are not extracted.")
+    excel_sheets = "financial" if financial_sheets_only else "all"
+    use_cache = st.sidebar.checkbox("Reuse cached extraction for previously processed files", value=True)
+    job_queue = get_job_queue()
+    job_workers = job_queue.max_workers
+    st.sidebar.caption(f"Documents processed concurrently: {job_workers} (server setting, {JOB_WORKERS_ENV})")
+    # page pools inside concurrent jobs share the CPUs instead of multiplying the process count
+    job_pdf_workers = pdf_workers_per_job(pdf_workers, job_workers)
+    if job_pdf_workers < pdf_workers:
+        st.sidebar.caption(f"PDF extraction limited to {job_pdf_workers} process(es) per document while {job_workers} documents run at once.")
+
+    uploaded_files = st.file_uploader("Upload PDF or Excel files (multiple allowed)", accept_multiple_files=True, type=["pdf","xls","xlsx","xlsm","xlsb"], help="Upload financial statements: Income statement, Balance sheet, Cash flow.")
+    process_button = st.button("Process uploaded documents")
+
+    if "registry" not in st.session_state:
+        # processed documents of this session and the indexes derived from them
+        st.session_state["registry"] = DocumentRegistry()
+    registry = st.session_state["registry"]
+    if "convo" not in st.session_state:
+        st.session_state["convo"] = []
+
+    # collect a finished batch; while one is pending, the rest of the page still renders and
+    # the script polls again at the very end
+    batch_pending = False
+    if st.session_state.get("batch"):
+        batch = st.session_state["batch"]
+        files = batch["files"]
+        statuses = {s["id"]: s for s in batch["queue"].status([job_id for _, _, job_id in files])}
+        pending = [s for s in statuses.values() if s["state"] in ("queued", "running")]
+        if pending:
+            batch_pending = True
+            st.progress(int((len(files) - len(pending)) / len(files) * 100))
+            for s in pending:
+                st.info(f"{s['name']}: {s['stage'] or s['state']}...")
+        else:
+            for fname, suffix, job_id in files:
+                job = batch["queue"].pop(job_id)
+                if job is None or job["state"] == "failed":
+                    st.error(f"Failed to process {fname}: {job['error'] if job else 'its result expired before it was collected'}")
+                    # never keep showing an older version of a file that failed to re-process
+                    registry.remove(fname)
+                    continue
+                result = job["result"]
+                fin = result["financials"]
+                registry.add(fname, result["key"], suffix, fin,
+                             document_chunks(result["key"], fname, result["text"], result["tables"], fin))
+                # the store follows the extraction cache, minus what this session still shows
+                for key in result["evicted"]:
+                    if key not in registry.doc_hashes.values():
+                        metric_store.delete_document(key)
+                if not result["cached"] or not metric_store.has_document(result["key"]):
+                    metric_store.write_document(result["key"], fname, fin, suffix, result["metric_pages"])
+                if result["cached"]:
+                    st.success(f"Loaded {fname} from cache: {len(fin)} metric groups found.")
                 else:
-                    text, tables = extract_from_excel(tmp_path)
-                doc_texts[fname] = {"text": text, "tables": tables}
-                fin = normalize_financial_data(text, tables)
-                all_financials[fname] = fin
-                st.success(f"Extracted from {fname}: {len(fin)} metric groups found.")
-            except Exception as e:
-                st.error(f"Failed to process {fname}: {e}")
-            progress.progress(int((i+1)/total*100))
-            try:
-                os.unlink(tmp_path)
-            except Exception:
-                pass
-
-        st.session_state["extracted_data"] = all_financials
-        st.session_state["doc_texts"] = doc_texts
-        st.success("Document processing completed.")
-
-# Show extracted summary
-if st.session_state["extracted_data"]:
-    st.subheader("Extracted financial metrics (preview)")
-    for fname, fin in st.session_state["extracted_data"].items():
-        st.markdown(f"**{fname}**")
-        if not fin:
-            st.write("_No clear metrics found. Try another document or check that the document contains standard statement tables._")
-            continue
-        # show summary table as JSON for quick view
-        st.json(fin)
-
-    st.markdown("---")
-    st.subheader("Ask questions about the uploaded documents")
-    col1, col2 = st.columns([3,1])
-    with col1:
-        question = st.text_input("Ask a question (e.g. 'What was revenue in 2023?')", key="question_input")
-        ask = st.button("Ask")
-    with col2:
-        selected_doc = st.selectbox("Select document (or 'all')", options=["all"] + list(st.session_state["extracted_data"].keys()))
-
-    if "history" not in st.session_state:
-        st.session_state["history"] = []
-
-    if ask and question.strip():
-        # Build context from extracted data
-        if selected_doc == "all":
-            context = build_document_summary_text(st.session_state["extracted_data"])
+                    st.success(f"Extracted from {fname}: {len(fin)} metric groups found.")
+                if result["pages"]:
+                    searched = sum(1 for page in result["pages"] if page["searched"])
+                    seconds = sum(page["seconds"] for page in result["pages"])
+                    with st.expander(f"{fname}: searched {searched} of {len(result['pages'])} pages for tables ({seconds:.2f}s)"):
+                        st.dataframe(result["pages"])
+
+            # keep the document order independent of which job finished first
+            registry.reorder(batch["order"])
+            st.session_state["batch"] = None
+            st.success("Document processing completed.")
+
+    if process_button:
+        if not uploaded_files:
+            st.warning("Please upload one or more PDF/Excel files first.")
+        elif batch_pending:
+            # a second batch would orphan the first one's jobs in the shared queue
+            st.warning("The previous batch is still being processed; try again when it has finished.")
+        else:
+            # only files that are new or changed since the last batch are processed again
+            uploads = []
+            for uploaded in uploaded_files:
+                fname = uploaded.name
+                suffix = fname.split(".")[-1].lower()
+                data = uploaded.getvalue()
+                uploads.append((fname, suffix, data, document_key(data, suffix, excel_sheets, pdf_fast_scan)))
+            new, removed = registry.diff([(fname, key) for fname, _, _, key in uploads])
+            if not use_cache:
+                new = [fname for fname, _, _, _ in uploads]
+            for fname in removed:
+                registry.remove(fname)
+            # hand the new files to the background workers; this run (and the UI) returns immediately
+            files = []
+            for fname, suffix, data, key in uploads:
+                if fname in new:
+                    job_id = job_queue.submit(fname, process_document, data, suffix,
+                                              pdf_workers=job_pdf_workers, excel_sheets=excel_sheets, use_cache=use_cache,
+                                              pdf_fast_scan=pdf_fast_scan)
+                    files.append((fname, suffix, job_id))
+            order = [fname for fname, _, _, _ in uploads]
+            if files:
+                st.session_state["batch"] = {"queue": job_queue, "files": files, "order": order}
+                batch_pending = True
+            else:
+                registry.reorder(order)
+                st.success(f"No new documents to process ({len(removed)} removed).")
+
+    def get_llm_context(question, selected_doc):
+        """
+        Context for the LLM prompt, only built when the LLM path runs. Memoized per
+        (documents loaded, selected doc, question, retrieval settings); the memo is
+        dropped whenever a new batch changes the loaded documents.
+        """
+        version = tuple(registry.doc_hashes.values())
+        memo = st.session_state.get("llm_contexts")
+        if memo is None or memo["version"] != version:
+            memo = st.session_state["llm_contexts"] = {"version": version, "contexts": {}}
+        key = (selected_doc, normalize_question(question), context_budget, embedding_model if use_embeddings else None)
+        if key in memo["contexts"]:
+            return memo["contexts"][key]
+        # the chunks most relevant to the question, within the token budget
+        retrieval_index = registry.retrieval_index
+        docs = None if selected_doc == "all" else [selected_doc]
+        if use_embeddings:
+            client = get_llm_client(ollama_url, ollama_model, ollama_timeout)
+            retrieval_index.set_embedder(lambda text: client.embed(text, embedding_model), embedding_model)
         else:
-            context = build_document_summary_text({selected_doc: st.session_state["extracted_data"][selected_doc]})
-        # Try rule-based first
-        answer, confidence = simple_qa_answer(question, st.session_state["extracted_data"], selected_doc)
-        source = "rule-based"
-        if confidence < 0.6 and use_ollama:
-            # send to Ollama (if configured). We wrap doc context and question.
-            prompt = f"""You are a financial assistant. Answer clearly and concisely.
+            retrieval_index.set_embedder(None)
+        try:
+            context = select_context(retrieval_index, question, context_budget, docs)
+        except OllamaError as e:
+            st.warning(f"Embedding re-ranking failed, using keyword retrieval only: {e}")
+            retrieval_index.set_embedder(None)
+            context = select_context(retrieval_index, question, context_budget, docs)
+        memo["contexts"][key] = context
+        return context
+
+    # metrics are read back from the shared store rather than kept per session
+    extracted_data = {fname: load_document_financials(h) for fname, h in registry.doc_hashes.items()}
+
+    # Show extracted summary
+    if extracted_data:
+        st.subheader("Extracted financial metrics (preview)")
+        for fname, fin in extracted_data.items():
+            st.markdown(f"**{fname}**")
+            if not fin:
+                st.write("_No clear metrics found. Try another document or check that the document contains standard statement tables._")
+                continue
+            # one row per metric, built once per document and reused on every rerun
+            st.dataframe(document_preview(registry.doc_hashes[fname]))
+        if len(set(registry.doc_hashes.values())) > 1:
+            with st.expander("Totals across documents"):
+                total_metric = st.selectbox("Metric", QA_METRICS, key="total_metric")
+                # summed per period in DuckDB over the rows of this session's documents
+                st.dataframe(metric_store.metric_totals(total_metric, registry.doc_hashes.values()))
+
+        st.markdown("---")
+        st.subheader("Ask questions about the uploaded documents")
+        col1, col2 = st.columns([3,1])
+        with col1:
+            question = st.text_input("Ask a question (e.g. 'What was revenue in 2023?')", key="question_input")
+            ask = st.button("Ask")
+        with col2:
+            selected_doc = st.selectbox("Select document (or 'all')", options=["all"] + list(extracted_data.keys()))
+
+        if "history" not in st.session_state:
+            st.session_state["history"] = []
+
+        if ask and question.strip():
+            # Try rule-based first
+            answer, confidence = simple_qa_answer(question, extracted_data, selected_doc, registry.metric_index)
+            source = "rule-based"
+            if confidence < 0.6 and use_ollama:
+                context = get_llm_context(question, selected_doc)
+                # send to Ollama (if configured). We wrap doc context and question.
+                prompt = f"""You are a financial assistant. Answer clearly and concisely.
 Document extracted summary:
 {context}
 
@@ -111,34 +253,52 @@ User question:
 
 Provide the best possible factual answer using the document. If not answerable, say you couldn't find it.
 """
-            try:
-                payload = {
-                    "model": ollama_model,
-                    "prompt": prompt,
-                    "max_tokens": 512
-                }
-                resp = requests.post(ollama_url, json=payload, timeout=20)
-                if resp.ok:
-                    j = resp.json()
-                    # Ollama responses vary; try to extract text
-                    if isinstance(j, dict) and "text" in j:
-                        answer_llm = j["text"]
-                    else:
-                        # fallback
-                        answer_llm = j.get("response") or str(j)
-                    answer = answer_llm
-                    source = "ollama"
+                options = {"num_predict": int(ollama_max_tokens)}
+                key = response_key(ollama_model, question, context, options)
+                cached_answer = response_cache.get(key)
+                if cached_answer is not None:
+                    answer = cached_answer
+                    source = "ollama, cached"
                 else:
-                    st.warning(f"Ollama request failed: {resp.status_code} {resp.text}")
-            except Exception as e:
-                st.warning(f"Error calling Ollama: {e}")
-
-        entry = {"question": question, "answer": answer, "source": source}
-        st.session_state["history"].append(entry)
-
-    # Show conversation history
-    if st.session_state.get("history"):
-        st.markdown("### Conversation")
-        for turn in reversed(st.session_state["history"]):
-            st.markdown(f"**Q:** {turn['question']}")
-            st.markdown(f"**A:** {turn['answer']}  \n*({turn['source']})*")
\ No newline at end of file
+                    # render tokens as they arrive instead of waiting for the whole answer
+                    placeholder = st.empty()
+                    try:
+                        client = get_llm_client(ollama_url, ollama_model, ollama_timeout)
+                        chunks = []
+                        for chunk in client.stream(prompt, **options):
+                            chunks.append(chunk)
+                            placeholder.markdown("".join(chunks) + "▌")
+                        placeholder.empty()
+                        answer = "".join(chunks)
+                        source = "ollama"
+                        # stream() raises unless Ollama finished the answer; never cache an empty one
+                        if answer.strip():
+                            response_cache.put(key, answer)
+                    except OllamaError as e:
+                        # drop the partial answer, the warning replaces it
+                        placeholder.empty()
+                        st.warning(str(e))
+
+            entry = {"question": question, "answer": answer, "source": source}
+            st.session_state["history"].append(entry)
+
+        if use_ollama:
+            stats = response_cache.stats()
+            st.sidebar.caption(f"Ollama answer cache: {stats['hits']} hits, {stats['misses']} misses")
+
+        # Show conversation history
+        if st.session_state.get("history"):
+            st.markdown("### Conversation")
+            for turn in reversed(st.session_state["history"]):
+                st.markdown(f"**Q:** {turn['question']}")
+                st.markdown(f"**A:** {turn['answer']}  \n*({turn['source']})*")
+
+    if batch_pending:
+        # poll the queue until the batch is finished, after the page has been drawn
+        time.sleep(POLL_SECONDS)
+        rerun()
+
+if __name__ == "__main__":
+    # Streamlit runs the script as __main__; spawned JobQueue workers re-import it under
+    # another name and must not build the page
+    main()
@@ -0,0 +1,62 @@
+# benchmarks/excel_engines.py
+"""
+Per-engine read_excel parse time over a corpus of workbooks.
+
+    python benchmarks/excel_engines.py statements/*.xlsx statements/*.xls --repeat 3
+
+Every installed engine that supports a file's format is timed on a full
+read_excel(sheet_name=None, header=None), and the engine extract_from_excel
+would pick is marked with "*".
+"""
+import argparse
+import importlib.util
+import os
+import statistics
+import sys
+import time
+
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from utils import detect_excel_format, select_excel_engine  # noqa: E402
+
+# engine -> (module that must be importable, formats it reads)
+ENGINES = {
+    "openpyxl": ("openpyxl", {"xlsx"}),
+    "calamine": ("python_calamine", {"xlsx", "xls", "xlsb"}),
+    "xlrd": ("xlrd", {"xls"}),
+    "pyxlsb": ("pyxlsb", {"xlsb"}),
+}
+
+def time_engine(path, engine, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        pd.read_excel(path, sheet_name=None, header=None, engine=engine)
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("files", nargs="+", help="workbooks to parse")
+    parser.add_argument("--repeat", type=int, default=3, help="runs per engine (median is reported)")
+    args = parser.parse_args(argv)
+
+    installed = [e for e, (module, _) in ENGINES.items() if importlib.util.find_spec(module)]
+    print(f"installed engines: {', '.join(installed)}")
+    print(f"{'file':40} {'format':6} {'engine':9} {'seconds':>9}")
+    for path in args.files:
+        fmt = detect_excel_format(path)
+        chosen = select_excel_engine(fmt)
+        for engine in installed:
+            if fmt not in ENGINES[engine][1]:
+                continue
+            try:
+                elapsed = f"{time_engine(path, engine, args.repeat):9.3f}"
+            except Exception as e:
+                elapsed = f"failed: {e}"
+            mark = "*" if engine == chosen else " "
+            print(f"{os.path.basename(path)[:40]:40} {fmt:6} {engine:8}{mark} {elapsed:>9}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,338 @@
+# benchmarks/pipeline.py
+"""
+Benchmark harness for the extraction and QA pipeline.
+
+Generates synthetic financial PDFs, workbooks and batches of small statement
+tables, times every stage (extract_from_pdf, extract_from_excel,
+normalize_financial_data, extract_metrics_from_tables, parse_number_array,
+build_metric_index, simple_qa_answer) and reports throughput plus the peak RSS
+of each case.
+Results are written as JSON so runs from different commits can be compared:
+
+    python benchmarks/pipeline.py --out before.json
+    python benchmarks/pipeline.py --out after.json --compare before.json
+
+--quick runs only the smallest sizes. Each case runs in its own process so the
+peak RSS belongs to that case alone.
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import utils  # noqa: E402
+
+PDF_PAGES = [10, 100, 1000]
+WORKBOOK_CELLS = [1_000, 100_000, 1_000_000]
+# many small statement tables, the shape PDF extraction produces
+STATEMENT_TABLES = [300, 3000]
+STATEMENT_TABLE_ROWS = 14
+QA_DOCUMENTS = 100
+QA_QUESTIONS = [
+    "What was revenue in 2023?",
+    "What is the latest net income?",
+    "Total assets in 2022",
+    "What was operating income last year?",
+    "How much cash did they have?",
+    "What was the gross profit?",
+    "What was the net loss?",
+]
+# statement-style cells for the number parsing stages, awkward ones included
+NUMBER_CORPUS = [
+    "$1,234", "(5,678)", "12.5%", "-5%", "1.2M", "3k", "7 B", "M", "—", "", "abc", "3.4.5",
+    "-$7", " 42 ", "1e3", "2023", "FY2022", "(12)%", "$ (1,000.50)", "12 Bn", "%5", "-",
+    "+3", "0.5K%", "Q1 2023", "1,2,3", "$1.2B", "0", "-0.25", "(0.5)",
+]
+# regressions beyond this ratio are flagged by --compare; stages faster than the floor are too noisy to judge
+REGRESSION_THRESHOLD = 1.10
+NOISE_FLOOR_SECONDS = 0.05
+
+STATEMENTS = [
+    ("Consolidated Statement of Operations", ["Total revenue", "Cost of revenue", "Gross profit", "Operating income", "Net income"]),
+    ("Consolidated Balance Sheet", ["Total assets", "Total liabilities", "Shareholders' equity"]),
+    ("Consolidated Statement of Cash Flows", ["Net cash provided by operating activities", "Cash and cash equivalents"]),
+]
+
+def _amount(rng):
+    v = rng.randint(1_000, 9_999_999)
+    return rng.choice([f"${v:,}", f"({v:,})", f"{v:,}"])
+
+# --- synthetic documents ---------------------------------------------------
+
+def _pdf_escape(s):
+    return s.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+def _statement_page(rng, title, labels):
+    ops = [f"BT /F1 14 Tf 50 740 Td ({_pdf_escape(title)}) Tj ET"]
+    rows = [["", "FY2023", "FY2022"]] + [[label, _amount(rng), _amount(rng)] for label in labels]
+    rows += [[f"Other item {i}", _amount(rng), _amount(rng)] for i in range(rng.randint(5, 20))]
+    xs = [50, 330, 440, 550]
+    top, height = 710, 18
+    for r, row in enumerate(rows):
+        y = top - (r + 1) * height + 5
+        for c, cell in enumerate(row):
+            ops.append(f"BT /F1 9 Tf {xs[c] + 4} {y} Td ({_pdf_escape(cell)}) Tj ET")
+    bottom = top - len(rows) * height
+    for r in range(len(rows) + 1):
+        ops.append(f"{xs[0]} {top - r * height} m {xs[-1]} {top - r * height} l S")
+    for x in xs:
+        ops.append(f"{x} {top} m {x} {bottom} l S")
+    return "\n".join(ops)
+
+def _narrative_page(rng):
+    words = ["revenue", "growth", "assets", "liabilities", "risk", "market", "operations", "the", "and", "of", "increased", "decreased"]
+    ops = []
+    for line in range(45):
+        text = " ".join(rng.choice(words) if rng.random() > 0.1 else _amount(rng) for _ in range(14))
+        ops.append(f"BT /F1 9 Tf 50 {750 - line * 15} Td ({_pdf_escape(text)}) Tj ET")
+    return "\n".join(ops)
+
+def make_pdf(path, n_pages, seed=0):
+    """Write an n_pages PDF: every fifth page is a ruled statement table, the rest narrative."""
+    rng = random.Random(seed)
+    contents = []
+    for p in range(n_pages):
+        if p % 5 == 0:
+            title, labels = STATEMENTS[(p // 5) % len(STATEMENTS)]
+            contents.append(_statement_page(rng, title, labels))
+        else:
+            contents.append(_narrative_page(rng))
+    # objects: 1 catalog, 2 page tree, 3 font, then (content stream, page) per page
+    kids = " ".join(f"{5 + 2 * i} 0 R" for i in range(n_pages))
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        f"<< /Type /Pages /Kids [{kids}] /Count {n_pages} >>".encode(),
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+    ]
+    for i, content in enumerate(contents):
+        stream = content.encode("latin-1")
+        objects.append(b"<< /Length %d >>\nstream\n%s\nendstream" % (len(stream), stream))
+        objects.append(f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] /Resources << /Font << /F1 3 0 R >> >> /Contents {4 + 2 * i} 0 R >>".encode())
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for num, body in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n%s\nendobj\n" % (num, body)
+    xref = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    for offset in offsets:
+        out += b"%010d 00000 n \n" % offset
+    out += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref)
+    with open(path, "wb") as f:
+        f.write(out)
+
+def make_statement_tables(n_tables, seed=0):
+    """n_tables small statement tables (a period header row, then STATEMENT_TABLE_ROWS - 1 rows), as extract_from_pdf returns them."""
+    import pandas as pd
+    rng = random.Random(seed)
+    tables = []
+    for i in range(n_tables):
+        _, labels = STATEMENTS[i % len(STATEMENTS)]
+        rows = [["", "FY2023", "FY2022"]] + [[label, _amount(rng), _amount(rng)] for label in labels]
+        rows += [[f"Other item {r}", _amount(rng), _amount(rng)] for r in range(STATEMENT_TABLE_ROWS - len(rows))]
+        tables.append(pd.DataFrame(rows))
+    return tables
+
+def make_workbook(path, n_cells, seed=0):
+    """Write a workbook with three statement sheets and a 10-column data sheet holding ~n_cells cells."""
+    import openpyxl
+    rng = random.Random(seed)
+    wb = openpyxl.Workbook(write_only=True)
+    for title, labels in STATEMENTS:
+        ws = wb.create_sheet(title[:31])
+        ws.append(["Item", "2023", "2022"])
+        for label in labels:
+            ws.append([label, _amount(rng), _amount(rng)])
+    ws = wb.create_sheet("Data")
+    for r in range(max(1, n_cells // 10)):
+        label = f"Revenue segment {r}" if r % 50 == 0 else f"Line {r}"
+        ws.append([label] + [rng.random() * 1e6 for _ in range(9)])
+    wb.save(path)
+
+# --- measurement -----------------------------------------------------------
+
+def _peak_rss_mb():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+def _timed(fn, *args, **kwargs):
+    start = time.perf_counter()
+    result = fn(*args, **kwargs)
+    return result, time.perf_counter() - start
+
+def _stage(case, stage, seconds, amount, unit):
+    return {"case": case, "stage": stage, "seconds": seconds, "throughput": amount / seconds if seconds else None, "unit": unit}
+
+def _table_cells(tables):
+    return sum(df.size for df in tables)
+
+def run_pdf_case(path, n_pages):
+    case = f"pdf-{n_pages}p"
+    (text, tables), t_extract = _timed(utils.extract_from_pdf, path)
+    _, t_unfiltered = _timed(utils.extract_from_pdf, path, table_filter=False)
+    _, t_fast = _timed(utils.extract_from_pdf, path, fast_scan=True)
+    # the same extraction with pdfplumber parsing the page objects itself
+    lean_parse = utils._parse_page_objects
+    utils._parse_page_objects = lambda page: None
+    try:
+        _, t_stock = _timed(utils.extract_from_pdf, path)
+    finally:
+        utils._parse_page_objects = lean_parse
+    cells = _table_cells(tables)
+    fin, t_norm = _timed(utils.normalize_financial_data, text, tables)
+    _, t_metrics = _timed(utils.extract_metrics_from_tables, tables, utils.FALLBACK_KEYWORDS)
+    rows = [
+        _stage(case, "extract_from_pdf", t_extract, n_pages, "pages/s"),
+        _stage(case, "extract_from_pdf table_filter=False", t_unfiltered, n_pages, "pages/s"),
+        _stage(case, "extract_from_pdf fast_scan=True", t_fast, n_pages, "pages/s"),
+        _stage(case, "extract_from_pdf stock object parsing", t_stock, n_pages, "pages/s"),
+        _stage(case, "normalize_financial_data", t_norm, cells, "cells/s"),
+        _stage(case, "extract_metrics_from_tables", t_metrics, cells, "cells/s"),
+    ]
+    # QA over many copies of this document, the shape of a large multi-filing upload
+    extracted = {f"filing-{i}.pdf": fin for i in range(QA_DOCUMENTS)}
+    index, t_index = _timed(utils.build_metric_index, extracted)
+    rows.append(_stage(case, f"build_metric_index x{QA_DOCUMENTS} docs", t_index, QA_DOCUMENTS, "docs/s"))
+    start = time.perf_counter()
+    for q in QA_QUESTIONS:
+        utils.simple_qa_answer(q, extracted, index=index)
+    rows.append(_stage(case, f"simple_qa_answer x{QA_DOCUMENTS} docs", time.perf_counter() - start, len(QA_QUESTIONS), "questions/s"))
+    return rows, _peak_rss_mb()
+
+def run_workbook_case(path, n_cells):
+    case = f"xlsx-{n_cells}cells"
+    (text, tables), t_all = _timed(utils.extract_from_excel, path)
+    _, t_fin = _timed(utils.extract_from_excel, path, sheets="financial")
+    cells = _table_cells(tables)
+    _, t_norm = _timed(utils.normalize_financial_data, text, tables)
+    _, t_metrics = _timed(utils.extract_metrics_from_tables, tables, utils.FALLBACK_KEYWORDS)
+    return [
+        _stage(case, "extract_from_excel", t_all, n_cells, "cells/s"),
+        _stage(case, "extract_from_excel sheets=financial", t_fin, n_cells, "cells/s"),
+        _stage(case, "normalize_financial_data", t_norm, cells, "cells/s"),
+        _stage(case, "extract_metrics_from_tables", t_metrics, cells, "cells/s"),
+    ], _peak_rss_mb()
+
+def run_statement_tables_case(n_tables):
+    case = f"tables-{n_tables}x{STATEMENT_TABLE_ROWS}rows"
+    tables = make_statement_tables(n_tables)
+    text = " ".join(title for title, _ in STATEMENTS)
+    cells = _table_cells(tables)
+    _, t_norm = _timed(utils.normalize_financial_data, text, tables)
+    _, t_metrics = _timed(utils.extract_metrics_from_tables, tables, utils.FALLBACK_KEYWORDS)
+    return [
+        _stage(case, "normalize_financial_data", t_norm, cells, "cells/s"),
+        _stage(case, "extract_metrics_from_tables", t_metrics, cells, "cells/s"),
+    ], _peak_rss_mb()
+
+def run_number_case(n_cells):
+    case = f"numbers-{n_cells}cells"
+    cells = (NUMBER_CORPUS * (n_cells // len(NUMBER_CORPUS) + 1))[:n_cells]
+    _, t_array = _timed(utils.parse_number_array, cells)
+    start = time.perf_counter()
+    for c in cells:
+        utils.clean_number_string(c)
+    t_scalar = time.perf_counter() - start
+    return [
+        _stage(case, "parse_number_array", t_array, n_cells, "cells/s"),
+        _stage(case, "clean_number_string", t_scalar, n_cells, "cells/s"),
+    ], _peak_rss_mb()
+
+def _run_case(fn, *args):
+    # a fresh process per case keeps peak RSS attributable to that case
+    with ProcessPoolExecutor(max_workers=1) as pool:
+        rows, peak = pool.submit(fn, *args).result()
+    for row in rows:
+        row["peak_rss_mb"] = round(peak, 1)
+    return rows
+
+# --- reporting -------------------------------------------------------------
+
+def _git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        return None
+
+def print_results(results):
+    print(f"{'case':22} {'stage':42} {'seconds':>9} {'throughput':>14} {'unit':12} {'peak MB':>8}")
+    for r in results:
+        tp = f"{r['throughput']:14.1f}" if r["throughput"] is not None else f"{'-':>14}"
+        print(f"{r['case']:22} {r['stage']:42} {r['seconds']:9.3f} {tp} {r['unit']:12} {r['peak_rss_mb']:8.1f}")
+
+def compare(results, baseline_path):
+    """Print the time ratio against a previous run; return the number of regressions."""
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    before = {(r["case"], r["stage"]): r for r in baseline["results"]}
+    regressions = 0
+    print(f"\ncompared with {baseline_path} (commit {baseline.get('commit')})")
+    for r in results:
+        old = before.get((r["case"], r["stage"]))
+        if not old or not old["seconds"]:
+            continue
+        ratio = r["seconds"] / old["seconds"]
+        noisy = max(r["seconds"], old["seconds"]) < NOISE_FLOOR_SECONDS
+        flag = "REGRESSION" if ratio > REGRESSION_THRESHOLD and not noisy else ""
+        regressions += bool(flag)
+        print(f"{r['case']:22} {r['stage']:42} {old['seconds']:9.3f} -> {r['seconds']:9.3f}  x{ratio:5.2f} {flag}")
+    return regressions
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pdf-pages", type=int, nargs="*", default=PDF_PAGES, help="PDF sizes in pages")
+    parser.add_argument("--cells", type=int, nargs="*", default=WORKBOOK_CELLS, help="workbook sizes in cells")
+    parser.add_argument("--tables", type=int, nargs="*", default=STATEMENT_TABLES, help="numbers of small statement tables")
+    parser.add_argument("--quick", action="store_true", help="only the smallest PDF and workbook")
+    parser.add_argument("--out", help="write JSON results here")
+    parser.add_argument("--compare", help="JSON results of an earlier run to compare against")
+    parser.add_argument("--workdir", help="keep generated documents here instead of a temp dir")
+    args = parser.parse_args(argv)
+    if args.quick:
+        args.pdf_pages = args.pdf_pages[:1]
+        args.cells = args.cells[:1]
+        args.tables = args.tables[:1]
+
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        workdir = args.workdir or tmp
+        os.makedirs(workdir, exist_ok=True)
+        for n_pages in args.pdf_pages:
+            path = os.path.join(workdir, f"synthetic-{n_pages}p.pdf")
+            if not os.path.exists(path):
+                make_pdf(path, n_pages)
+            results += _run_case(run_pdf_case, path, n_pages)
+        for n_cells in args.cells:
+            path = os.path.join(workdir, f"synthetic-{n_cells}cells.xlsx")
+            if not os.path.exists(path):
+                make_workbook(path, n_cells)
+            results += _run_case(run_workbook_case, path, n_cells)
+            results += _run_case(run_number_case, n_cells)
+        for n_tables in args.tables:
+            results += _run_case(run_statement_tables_case, n_tables)
+
+    print_results(results)
+    report = {
+        "commit": _git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "results": results,
+    }
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(report, f, indent=2)
+    if args.compare:
+        sys.exit(1 if compare(results, args.compare) else 0)
+
+if __name__ == "__main__":
+    main()
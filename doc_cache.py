@@ -0,0 +1,118 @@
+# doc_cache.py
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import pandas as pd
+
+# bump whenever extraction/normalization output changes so stale entries are never served
+EXTRACTOR_VERSION = "2"
+
+DEFAULT_CACHE_DIR = os.path.join(".cache", "extraction")
+DEFAULT_MAX_BYTES = 512 * 1024 * 1024
+
+def content_key(data, *options):
+    """SHA-256 of the uploaded bytes plus the extractor version (and any output-changing options)."""
+    h = hashlib.sha256()
+    h.update(f"v{EXTRACTOR_VERSION}|{'|'.join(str(o) for o in options)}|".encode())
+    h.update(data)
+    return h.hexdigest()
+
+class ExtractionCache:
+    """
+    On-disk cache of extract_from_pdf/extract_from_excel output and the matching
+    normalize_financial_data result, one directory per content key:
+        text.txt         extracted text
+        tables.pkl       list of DataFrames (pickled: pdf headers may be duplicate or None,
+                         which Parquet cannot store)
+        financials.json  normalized metrics
+        metric_pages.json  {section: {label: page}} for those metrics (see normalize_financial_data)
+    Entries are evicted least-recently-used first once the total size exceeds max_bytes.
+    """
+
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR, max_bytes=DEFAULT_MAX_BYTES):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+
+    def _entry_dir(self, key):
+        return os.path.join(self.cache_dir, key)
+
+    def get(self, key):
+        """Return (text, tables, financials, metric_pages) or None if the key is not cached."""
+        entry = self._entry_dir(key)
+        try:
+            with open(os.path.join(entry, "text.txt"), encoding="utf-8") as f:
+                text = f.read()
+            tables = pd.read_pickle(os.path.join(entry, "tables.pkl"))
+            with open(os.path.join(entry, "financials.json"), encoding="utf-8") as f:
+                financials = json.load(f)
+            with open(os.path.join(entry, "metric_pages.json"), encoding="utf-8") as f:
+                metric_pages = json.load(f)
+        except Exception:
+            return None
+        # directory mtime doubles as the LRU timestamp
+        try:
+            os.utime(entry)
+        except OSError:
+            pass
+        return text, tables, financials, metric_pages
+
+    def put(self, key, text, tables, financials, metric_pages=None):
+        """Store one document's output; returns the keys evicted to make room (see evict)."""
+        os.makedirs(self.cache_dir, exist_ok=True)
+        tmp = tempfile.mkdtemp(prefix=".tmp-", dir=self.cache_dir)
+        try:
+            with open(os.path.join(tmp, "text.txt"), "w", encoding="utf-8") as f:
+                f.write(text or "")
+            pd.to_pickle(list(tables), os.path.join(tmp, "tables.pkl"))
+            with open(os.path.join(tmp, "financials.json"), "w", encoding="utf-8") as f:
+                json.dump(financials, f)
+            with open(os.path.join(tmp, "metric_pages.json"), "w", encoding="utf-8") as f:
+                json.dump(metric_pages or {}, f)
+            self._install(tmp, self._entry_dir(key))
+        except OSError:
+            shutil.rmtree(tmp, ignore_errors=True)
+            return []
+        return self.evict()
+
+    def _install(self, tmp, entry):
+        # rename is atomic, so readers never see a half-written entry
+        try:
+            os.replace(tmp, entry)
+            return
+        except OSError:
+            if not os.path.isdir(entry):
+                raise
+        # an entry is already there: another session's copy of the same document, or one get()
+        # could not read (say a pickle from an older pandas); either way ours replaces it, or
+        # the document would be re-extracted on every upload
+        old = tmp + ".old"
+        os.rename(entry, old)
+        try:
+            os.replace(tmp, entry)
+        finally:
+            shutil.rmtree(old, ignore_errors=True)
+
+    def evict(self):
+        """Remove least recently used entries until the cache fits in max_bytes; returns their keys."""
+        evicted = []
+        entries = []
+        total = 0
+        for name in os.listdir(self.cache_dir):
+            path = os.path.join(self.cache_dir, name)
+            if name.startswith(".") or not os.path.isdir(path):
+                continue
+            try:
+                size = sum(e.stat().st_size for e in os.scandir(path))
+                entries.append((os.stat(path).st_mtime, size, path))
+            except OSError:
+                continue
+            total += size
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            shutil.rmtree(path, ignore_errors=True)
+            evicted.append(os.path.basename(path))
+            total -= size
+        return evicted
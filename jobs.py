@@ -0,0 +1,181 @@
+# jobs.py
+import itertools
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from utils import extract_from_pdf, extract_from_excel, normalize_financial_data
+from doc_cache import ExtractionCache, content_key
+
+DEFAULT_JOB_WORKERS = 2
+# server-wide number of documents processed at once, read when the shared queue is built
+JOB_WORKERS_ENV = "DOC_QA_JOB_WORKERS"
+
+# finished jobs nobody collects (say the tab was closed mid-batch) are dropped after this
+FINISHED_JOB_TTL_SECONDS = 15 * 60
+
+def configured_job_workers():
+    """Job workers for this server: $DOC_QA_JOB_WORKERS if it is a positive integer, else DEFAULT_JOB_WORKERS."""
+    try:
+        return max(1, int(os.environ.get(JOB_WORKERS_ENV, DEFAULT_JOB_WORKERS)))
+    except ValueError:
+        return DEFAULT_JOB_WORKERS
+
+def pdf_workers_per_job(pdf_workers, job_workers):
+    """
+    Page-extraction processes each job may start, so that job_workers concurrent jobs with
+    their page pools stay within the CPU count (or job_workers, whichever is larger).
+    """
+    budget = max(os.cpu_count() or 1, job_workers)
+    return max(1, min(pdf_workers, budget // job_workers))
+
+def document_key(data, suffix, excel_sheets="all", pdf_fast_scan=False):
+    """Content key process_document files a document under (only options that change its output count)."""
+    if suffix != "pdf":
+        return content_key(data, excel_sheets)
+    return content_key(data, "fast-scan") if pdf_fast_scan else content_key(data)
+
+def process_document(data, suffix, pdf_workers=1, excel_sheets="all", use_cache=True, report=None, pdf_fast_scan=False):
+    """
+    Extract and normalize one uploaded file, going through the extraction cache.
+    Returns {"key", "text", "tables", "financials", "metric_pages", "cached", "pages", "evicted"};
+    metric_pages gives each metric's PDF page (see normalize_financial_data), pages is the
+    per-page table detection log of a freshly extracted PDF (see extract_from_pdf), else None,
+    and evicted lists the cache keys dropped to make room for this one.
+    report, if given, is called with the current stage name.
+    """
+    report = report or (lambda stage: None)
+    key = document_key(data, suffix, excel_sheets, pdf_fast_scan)
+    cache = ExtractionCache()
+    cached = cache.get(key) if use_cache else None
+    if cached:
+        text, tables, fin, metric_pages = cached
+        return {"key": key, "text": text, "tables": tables, "financials": fin, "metric_pages": metric_pages,
+                "cached": True, "pages": None, "evicted": []}
+    report("extracting")
+    pages = None
+    if suffix == "pdf":
+        pages = []
+        text, tables = extract_from_pdf(data, workers=pdf_workers, page_log=pages, fast_scan=pdf_fast_scan)
+    else:
+        text, tables = extract_from_excel(data, sheets=excel_sheets)
+    report("normalizing")
+    metric_pages = {}
+    fin = normalize_financial_data(text, tables, metric_pages)
+    evicted = cache.put(key, text, tables, fin, metric_pages) if use_cache else []
+    return {"key": key, "text": text, "tables": tables, "financials": fin, "metric_pages": metric_pages,
+            "cached": False, "pages": pages, "evicted": evicted}
+
+class JobQueue:
+    """
+    Background worker pool for document processing, shared by every Streamlit session
+    so parsing never blocks a script run. Jobs are tracked by id:
+        {"id", "name", "state": queued|running|done|failed, "stage", "error", "result",
+         "submitted", "started", "finished"}
+    By default jobs run in a bounded process pool, so a batch of files is parsed on
+    several cores at once; with processes=False a thread pool is used instead, which
+    also reports the current stage. The UI polls status() and collects finished jobs
+    with pop(); at most max_workers jobs run at once, the rest wait in submission order.
+    A finished job that nobody asks about (status or pop) for result_ttl seconds is
+    dropped with its result, so abandoned batches do not hold memory for good.
+    Worker processes are spawned rather than forked, since the Streamlit server that owns
+    the queue is multi-threaded and holds open database connections.
+    """
+
+    def __init__(self, max_workers=DEFAULT_JOB_WORKERS, processes=True, result_ttl=FINISHED_JOB_TTL_SECONDS):
+        self.max_workers = max_workers
+        self.processes = processes
+        self.result_ttl = result_ttl
+        self._executor = self._new_executor()
+        self._jobs = {}
+        self._futures = {}
+        # job id -> last time its submitter asked about it
+        self._seen = {}
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def _new_executor(self):
+        if self.processes:
+            return ProcessPoolExecutor(max_workers=self.max_workers, mp_context=multiprocessing.get_context("spawn"))
+        return ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="doc-job")
+
+    def submit(self, name, fn, *args, **kwargs):
+        """Queue fn(*args, **kwargs) and return the job id. fn must be picklable in process mode."""
+        with self._lock:
+            self._expire()
+            job_id = next(self._ids)
+            self._jobs[job_id] = {"id": job_id, "name": name, "state": "queued", "stage": None, "error": None,
+                                  "result": None, "submitted": time.time(), "started": None, "finished": None}
+            executor = self._executor
+        try:
+            future = self._submit(executor, job_id, fn, args, kwargs)
+        except BrokenProcessPool:
+            # a worker died (e.g. out of memory); start a fresh pool for new work, once,
+            # even if several sessions hit the broken one at the same time
+            with self._lock:
+                if self._executor is executor:
+                    self._executor = self._new_executor()
+                executor = self._executor
+            future = self._submit(executor, job_id, fn, args, kwargs)
+        with self._lock:
+            self._futures[job_id] = future
+        future.add_done_callback(lambda f: self._finish(job_id, f))
+        return job_id
+
+    def _submit(self, executor, job_id, fn, args, kwargs):
+        if self.processes:
+            return executor.submit(fn, *args, **kwargs)
+        return executor.submit(self._run, job_id, fn, args, kwargs)
+
+    def _expire(self):
+        # called with the lock held
+        cutoff = time.time() - self.result_ttl
+        for job_id, job in list(self._jobs.items()):
+            if job["finished"] is not None and max(job["finished"], self._seen.get(job_id, 0)) < cutoff:
+                del self._jobs[job_id]
+                self._seen.pop(job_id, None)
+
+    def _update(self, job_id, **fields):
+        with self._lock:
+            self._jobs[job_id].update(fields)
+
+    def _run(self, job_id, fn, args, kwargs):
+        self._update(job_id, state="running", started=time.time())
+        return fn(*args, report=lambda stage: self._update(job_id, stage=stage), **kwargs)
+
+    def _finish(self, job_id, future):
+        try:
+            result = future.result()
+        except Exception as e:
+            self._update(job_id, state="failed", error=str(e) or type(e).__name__, finished=time.time())
+        else:
+            self._update(job_id, state="done", result=result, finished=time.time())
+        with self._lock:
+            self._futures.pop(job_id, None)
+            self._expire()
+
+    def status(self, job_ids):
+        """Snapshot of the given jobs (without their results), in the order asked."""
+        with self._lock:
+            self._expire()
+            now = time.time()
+            snapshot = []
+            for i in job_ids:
+                if i not in self._jobs:
+                    continue
+                self._seen[i] = now
+                job = {k: v for k, v in self._jobs[i].items() if k != "result"}
+                future = self._futures.get(i)
+                # process workers cannot report back, so ask the future
+                if job["state"] == "queued" and future is not None and future.running():
+                    job["state"] = "running"
+                snapshot.append(job)
+            return snapshot
+
+    def pop(self, job_id):
+        """Remove a finished job and return its record, result included."""
+        with self._lock:
+            self._seen.pop(job_id, None)
+            return self._jobs.pop(job_id, None)
@@ -0,0 +1,84 @@
+# llm_cache.py
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+DEFAULT_DB_PATH = os.path.join(".cache", "llm_responses.sqlite")
+DEFAULT_MAX_ENTRIES = 256
+DEFAULT_TTL_SECONDS = 7 * 24 * 3600
+
+def normalize_question(question):
+    """Lowercase, collapse whitespace and drop trailing punctuation so trivial rewordings share a key."""
+    return re.sub(r"\s+", " ", question.lower()).strip().rstrip("?.! ")
+
+def response_key(model, question, context, options):
+    """Hash of (model, normalized question, context hash, generation options)."""
+    context_hash = hashlib.sha256(context.encode("utf-8")).hexdigest()
+    raw = json.dumps([model, normalize_question(question), context_hash, options], sort_keys=True)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+class ResponseCache:
+    """
+    LLM answer cache: an in-memory LRU of max_entries answers in front of an optional
+    SQLite table (db_path) that survives restarts. Entries older than ttl_seconds are
+    ignored in both tiers. Hit/miss counters are in stats().
+    """
+
+    def __init__(self, max_entries=DEFAULT_MAX_ENTRIES, db_path=None, ttl_seconds=DEFAULT_TTL_SECONDS):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._counts = {"hits": 0, "memory_hits": 0, "disk_hits": 0, "misses": 0}
+        self._db = None
+        if db_path:
+            if os.path.dirname(db_path):
+                os.makedirs(os.path.dirname(db_path), exist_ok=True)
+            self._db = sqlite3.connect(db_path, check_same_thread=False)
+            self._db.execute("CREATE TABLE IF NOT EXISTS responses (key TEXT PRIMARY KEY, response TEXT, created REAL)")
+            self._db.commit()
+
+    def _remember(self, key, response, created):
+        self._memory[key] = (response, created)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    def get(self, key):
+        """Return the cached answer or None."""
+        oldest = time.time() - self.ttl_seconds
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry and entry[1] >= oldest:
+                self._memory.move_to_end(key)
+                self._counts["hits"] += 1
+                self._counts["memory_hits"] += 1
+                return entry[0]
+            if self._db is not None:
+                row = self._db.execute("SELECT response, created FROM responses WHERE key = ? AND created >= ?",
+                                       (key, oldest)).fetchone()
+                if row:
+                    self._remember(key, row[0], row[1])
+                    self._counts["hits"] += 1
+                    self._counts["disk_hits"] += 1
+                    return row[0]
+            self._counts["misses"] += 1
+            return None
+
+    def put(self, key, response):
+        created = time.time()
+        with self._lock:
+            self._remember(key, response, created)
+            if self._db is not None:
+                self._db.execute("INSERT OR REPLACE INTO responses VALUES (?, ?, ?)", (key, response, created))
+                self._db.execute("DELETE FROM responses WHERE created < ?", (created - self.ttl_seconds,))
+                self._db.commit()
+
+    def stats(self):
+        with self._lock:
+            return dict(self._counts, entries=len(self._memory))
@@ -0,0 +1,97 @@
+# llm_client.py
+import json
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+DEFAULT_URL = "http://localhost:11434/api/generate"
+DEFAULT_CONNECT_TIMEOUT = 3.05
+DEFAULT_READ_TIMEOUT = 120
+DEFAULT_RETRIES = 2
+DEFAULT_NUM_PREDICT = 512
+# how long Ollama keeps the model loaded after a request, so follow-up questions skip the load
+DEFAULT_KEEP_ALIVE = "10m"
+
+class OllamaError(Exception):
+    pass
+
+class OllamaClient:
+    """
+    Ollama /api/generate client with a pooled keep-alive session, retries with
+    exponential backoff on connection errors and 502/503/504, and NDJSON streaming.
+    Generation options go in Ollama's "options" object (num_predict, temperature, ...).
+    read_timeout is the longest wait for the next streamed chunk, not for the whole answer.
+    """
+
+    def __init__(self, url=DEFAULT_URL, model="llama2", connect_timeout=DEFAULT_CONNECT_TIMEOUT,
+                 read_timeout=DEFAULT_READ_TIMEOUT, retries=DEFAULT_RETRIES, backoff_factor=0.5,
+                 pool_size=8, keep_alive=DEFAULT_KEEP_ALIVE):
+        self.url = url
+        self.model = model
+        self.timeout = (connect_timeout, read_timeout)
+        self.keep_alive = keep_alive
+        retry = Retry(total=retries, backoff_factor=backoff_factor, status_forcelist=(502, 503, 504),
+                      allowed_methods=frozenset(["POST"]), raise_on_status=False)
+        adapter = HTTPAdapter(max_retries=retry, pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session = requests.Session()
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def _payload(self, prompt, stream, options):
+        return {
+            "model": self.model,
+            "prompt": prompt,
+            "stream": stream,
+            "keep_alive": self.keep_alive,
+            "options": {"num_predict": DEFAULT_NUM_PREDICT, **options},
+        }
+
+    def _post(self, payload):
+        try:
+            resp = self.session.post(self.url, json=payload, timeout=self.timeout, stream=payload["stream"])
+        except requests.RequestException as e:
+            raise OllamaError(f"Error calling Ollama: {e}") from e
+        if not resp.ok:
+            raise OllamaError(f"Ollama request failed: {resp.status_code} {resp.text}")
+        return resp
+
+    def stream(self, prompt, **options):
+        """Yield answer text chunks as Ollama produces them; OllamaError if the stream stops early."""
+        with self._post(self._payload(prompt, True, options)) as resp:
+            try:
+                for line in resp.iter_lines():
+                    if not line:
+                        continue
+                    try:
+                        chunk = json.loads(line)
+                    except ValueError as e:
+                        raise OllamaError(f"Unexpected response from Ollama: {line[:200]!r}") from e
+                    if "error" in chunk:
+                        raise OllamaError(f"Ollama error: {chunk['error']}")
+                    if chunk.get("response"):
+                        yield chunk["response"]
+                    if chunk.get("done"):
+                        return
+            except requests.RequestException as e:
+                raise OllamaError(f"Ollama stream interrupted: {e}") from e
+        # the connection closed before Ollama's final "done" message
+        raise OllamaError("Ollama stream ended before the answer was complete")
+
+    def embed(self, text, model=None):
+        """Embedding vector for text from Ollama's /api/embeddings endpoint (next to the generate URL)."""
+        url = self.url.rsplit("/api/", 1)[0] + "/api/embeddings"
+        try:
+            resp = self.session.post(url, json={"model": model or self.model, "prompt": text,
+                                                "keep_alive": self.keep_alive}, timeout=self.timeout)
+        except requests.RequestException as e:
+            raise OllamaError(f"Error calling Ollama: {e}") from e
+        if not resp.ok:
+            raise OllamaError(f"Ollama embeddings request failed: {resp.status_code} {resp.text}")
+        return resp.json()["embedding"]
+
+    def generate(self, prompt, **options):
+        """Return the whole answer in one response (no streaming)."""
+        j = self._post(self._payload(prompt, False, options)).json()
+        if "error" in j:
+            raise OllamaError(f"Ollama error: {j['error']}")
+        return j.get("response", "")
@@ -0,0 +1,106 @@
+# metric_store.py
+import os
+import threading
+import duckdb
+import pandas as pd
+
+DEFAULT_STORE_PATH = os.path.join(".cache", "metrics.duckdb")
+
+COLUMNS = ["doc_hash", "filename", "section", "metric_label", "period", "value", "page", "source", "ordinal"]
+
+class MetricStore:
+    """
+    Local DuckDB table of normalized metrics shared by every session, one row per
+    (document, section, label, period):
+        doc_hash, filename, section, metric_label, period, value, page, source, ordinal
+    doc_hash is the content key of the uploaded file, so a document extracted once is
+    reused by everyone who uploads the same bytes. A label found without any period
+    values is kept as a single row with NULL period and value. ordinal keeps the original
+    section/label/period order so load_financials rebuilds normalize_financial_data's
+    dict exactly. page is the PDF page of the table a label came from (NULL for
+    spreadsheets). Rows live as long as the document's extraction cache entry: the app
+    deletes a document once the cache evicts it, so the store stays bounded too.
+    """
+
+    def __init__(self, path=DEFAULT_STORE_PATH):
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.path = path
+        self._con = duckdb.connect(path)
+        # one connection per process; cursors are cheap and the lock serializes writers
+        self._lock = threading.Lock()
+        self._con.execute("""
+            CREATE TABLE IF NOT EXISTS metrics (
+                doc_hash VARCHAR, filename VARCHAR, section VARCHAR, metric_label VARCHAR,
+                period VARCHAR, value DOUBLE, page INTEGER, source VARCHAR, ordinal INTEGER
+            )
+        """)
+
+    def _query(self, sql, params=None):
+        with self._lock:
+            return self._con.cursor().execute(sql, params or []).df()
+
+    def has_document(self, doc_hash):
+        return not self._query("SELECT 1 FROM metrics WHERE doc_hash = ? LIMIT 1", [doc_hash]).empty
+
+    def write_document(self, doc_hash, filename, financials, source, metric_pages=None):
+        """
+        Replace the rows of one document with the normalize_financial_data output;
+        metric_pages is the {section: {label: page}} dict normalization filled in.
+        """
+        metric_pages = metric_pages or {}
+        rows = []
+        for section, metrics in financials.items():
+            pages = metric_pages.get(section, {})
+            for label, periods in metrics.items():
+                page = pages.get(label)
+                if not periods:
+                    # marker row so the label (and its section) survives the round trip
+                    rows.append((doc_hash, filename, section, label, None, None, page, source, len(rows)))
+                for period, value in periods.items():
+                    rows.append((doc_hash, filename, section, label, str(period), value, page, source, len(rows)))
+        df = pd.DataFrame(rows, columns=COLUMNS).astype({"page": "Int32"})
+        with self._lock:
+            cur = self._con.cursor()
+            cur.execute("BEGIN TRANSACTION")
+            cur.execute("DELETE FROM metrics WHERE doc_hash = ?", [doc_hash])
+            cur.register("new_rows", df)
+            cur.execute(f"INSERT INTO metrics SELECT {', '.join(COLUMNS)} FROM new_rows")
+            cur.execute("COMMIT")
+
+    def delete_document(self, doc_hash):
+        """Drop every row of one document, e.g. once its extraction cache entry is evicted."""
+        with self._lock:
+            self._con.cursor().execute("DELETE FROM metrics WHERE doc_hash = ?", [doc_hash])
+
+    def load_financials(self, doc_hashes):
+        """
+        doc_hashes maps display filename -> doc_hash. Returns {filename: financials} in the
+        same order, each financials dict shaped like normalize_financial_data's result.
+        """
+        result = {fname: {} for fname in doc_hashes}
+        if not doc_hashes:
+            return result
+        df = self._query(
+            "SELECT doc_hash, section, metric_label, period, value FROM metrics "
+            "WHERE doc_hash IN (SELECT unnest(?)) ORDER BY doc_hash, ordinal",
+            [list(set(doc_hashes.values()))],
+        )
+        by_hash = {}
+        for doc_hash, section, label, period, value in df.itertuples(index=False):
+            periods = by_hash.setdefault(doc_hash, {}).setdefault(section, {}).setdefault(label, {})
+            if not pd.isna(period):
+                periods[period] = value
+        for fname, doc_hash in doc_hashes.items():
+            result[fname] = by_hash.get(doc_hash, {})
+        return result
+
+    def metric_totals(self, label_substring, doc_hashes=None):
+        """Cross-document aggregate: per period, sum/avg/count of values whose label contains label_substring."""
+        sql = ("SELECT period, SUM(value) AS total, AVG(value) AS mean, COUNT(DISTINCT doc_hash) AS documents "
+               "FROM metrics WHERE period IS NOT NULL AND contains(lower(metric_label), lower(?))")
+        params = [label_substring]
+        if doc_hashes is not None:
+            sql += " AND doc_hash IN (SELECT unnest(?))"
+            params.append(list(doc_hashes))
+        return self._query(sql + " GROUP BY period ORDER BY period", params)
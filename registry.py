@@ -0,0 +1,53 @@
+# registry.py
+from utils import build_metric_index, add_document_to_index, remove_document_from_index
+from retrieval import RetrievalIndex
+
+class DocumentRegistry:
+    """
+    The documents loaded in one session and the indexes derived from them, updated one
+    document at a time. Documents are identified by filename and content key, so a new
+    upload list can be diffed against what is already processed: only new or changed
+    files need extracting, removed ones are dropped from every index, and the rest are
+    left alone.
+        docs: {fname: {"key", "suffix"}} in upload order
+        metric_index: utils.build_metric_index structure
+        retrieval_index: retrieval.RetrievalIndex
+    """
+
+    def __init__(self):
+        self.docs = {}
+        self.metric_index = build_metric_index({})
+        self.retrieval_index = RetrievalIndex()
+
+    @property
+    def doc_hashes(self):
+        """{fname: content key} in upload order, as the metric store expects."""
+        return {fname: doc["key"] for fname, doc in self.docs.items()}
+
+    def diff(self, uploads):
+        """
+        uploads is [(fname, key)] for the current upload list. Returns (new, removed):
+        the filenames whose content is not processed yet, and the processed filenames
+        no longer uploaded.
+        """
+        names = {fname for fname, _ in uploads}
+        new = [fname for fname, key in uploads if self.docs.get(fname, {}).get("key") != key]
+        removed = [fname for fname in self.docs if fname not in names]
+        return new, removed
+
+    def add(self, fname, key, suffix, financials, chunks):
+        """Add (or replace) one processed document and index it."""
+        self.docs[fname] = {"key": key, "suffix": suffix}
+        add_document_to_index(self.metric_index, fname, financials)
+        self.retrieval_index.add_document(fname, chunks)
+
+    def remove(self, fname):
+        self.docs.pop(fname, None)
+        remove_document_from_index(self.metric_index, fname)
+        self.retrieval_index.remove_document(fname)
+
+    def reorder(self, fnames):
+        """Put the documents in the given (upload) order; unknown names are ignored."""
+        self.docs = {fname: self.docs[fname] for fname in fnames if fname in self.docs}
+        self.metric_index["docs"] = {fname: position for position, fname in enumerate(self.docs)}
+        self.metric_index["next_position"] = len(self.docs)
@@ -0,0 +1,195 @@
+# retrieval.py
+import math
+import re
+from collections import Counter
+
+import numpy as np
+from utils import estimate_tokens, format_metric_table
+
+DEFAULT_TOKEN_BUDGET = 1500
+DEFAULT_TOP_K = 8
+CHUNK_WORDS = 150
+CHUNK_OVERLAP = 30
+TABLE_CHUNK_ROWS = 25
+# BM25 parameters
+K1 = 1.5
+B = 0.75
+
+token_re = re.compile(r"\w+")
+
+def tokenize(text):
+    return token_re.findall(text.lower())
+
+def chunk_document(fname, text, tables, financials=None):
+    """
+    Split one document into retrievable chunks: overlapping word windows of the text,
+    row groups of every table (rendered as TSV with the header row repeated), and a
+    compact metric table per normalized statement section (utils.format_metric_table).
+    Returns [{"doc", "kind", "title", "text"}].
+    """
+    chunks = []
+    words = (text or "").split()
+    step = CHUNK_WORDS - CHUNK_OVERLAP
+    for start in range(0, len(words), step):
+        chunks.append({"doc": fname, "kind": "text", "title": f"text {start // step + 1}",
+                       "text": " ".join(words[start:start + CHUNK_WORDS])})
+        if start + CHUNK_WORDS >= len(words):
+            break
+    for t, df in enumerate(tables or []):
+        df = df.fillna("").astype(str)
+        header = "\t".join(str(c) for c in df.columns)
+        rows = ["\t".join(r) for r in df.itertuples(index=False, name=None)]
+        for start in range(0, max(len(rows), 1), TABLE_CHUNK_ROWS):
+            group = rows[start:start + TABLE_CHUNK_ROWS]
+            chunks.append({"doc": fname, "kind": "table", "title": f"table {t + 1} rows {start + 1}-{start + len(group)}",
+                           "text": "\n".join([header] + group)})
+    for section, metrics in (financials or {}).items():
+        chunks.append({"doc": fname, "kind": "metrics", "title": section, "text": format_metric_table(metrics)})
+    return chunks
+
+class RetrievalIndex:
+    """
+    Incremental BM25 index over document chunks, with optional embedding re-ranking.
+    embed, if given, maps a string to a vector (e.g. OllamaClient.embed); the BM25
+    candidates are then re-ranked by cosine similarity and the two rankings fused with
+    reciprocal rank fusion. Chunk embeddings are computed lazily and kept.
+    """
+
+    def __init__(self, embed=None):
+        self.embed = embed
+        self._embed_name = None
+        self._chunks = {}
+        self._postings = {}
+        self._lengths = {}
+        self._doc_chunks = {}
+        self._embeddings = {}
+        self._next_id = 0
+        self._total_length = 0
+
+    def set_embedder(self, embed, name=None):
+        """Switch the embedding function; cached chunk embeddings are dropped when name changes."""
+        if name != self._embed_name:
+            self._embeddings = {}
+            self._embed_name = name
+        self.embed = embed
+
+    def add_document(self, fname, chunks):
+        """Index (or re-index) one document's chunks."""
+        self.remove_document(fname)
+        ids = []
+        for chunk in chunks:
+            cid = self._next_id
+            self._next_id += 1
+            terms = Counter(tokenize(chunk["title"] + " " + chunk["text"]))
+            for term, tf in terms.items():
+                self._postings.setdefault(term, {})[cid] = tf
+            length = sum(terms.values())
+            self._lengths[cid] = length
+            self._total_length += length
+            self._chunks[cid] = chunk
+            ids.append(cid)
+        self._doc_chunks[fname] = ids
+
+    def remove_document(self, fname):
+        for cid in self._doc_chunks.pop(fname, []):
+            chunk = self._chunks.pop(cid)
+            for term in set(tokenize(chunk["title"] + " " + chunk["text"])):
+                postings = self._postings.get(term)
+                if postings is not None:
+                    postings.pop(cid, None)
+                    if not postings:
+                        del self._postings[term]
+            self._total_length -= self._lengths.pop(cid)
+            self._embeddings.pop(cid, None)
+
+    def _bm25(self, query, allowed):
+        n = len(self._chunks)
+        if not n:
+            return {}
+        avg_len = self._total_length / n
+        scores = {}
+        for term in set(tokenize(query)):
+            postings = self._postings.get(term)
+            if not postings:
+                continue
+            idf = math.log(1 + (n - len(postings) + 0.5) / (len(postings) + 0.5))
+            for cid, tf in postings.items():
+                if allowed is not None and self._chunks[cid]["doc"] not in allowed:
+                    continue
+                norm = tf * (K1 + 1) / (tf + K1 * (1 - B + B * self._lengths[cid] / avg_len))
+                scores[cid] = scores.get(cid, 0.0) + idf * norm
+        return scores
+
+    def _embedding(self, cid):
+        if cid not in self._embeddings:
+            chunk = self._chunks[cid]
+            self._embeddings[cid] = np.asarray(self.embed(chunk["title"] + "\n" + chunk["text"]), dtype="float64")
+        return self._embeddings[cid]
+
+    def search(self, query, k=DEFAULT_TOP_K, docs=None):
+        """Return up to k chunks most relevant to query, best first; docs limits the documents searched."""
+        allowed = set(docs) if docs is not None else None
+        scores = self._bm25(query, allowed)
+        ranked = sorted(scores, key=lambda cid: (-scores[cid], cid))
+        if not ranked:
+            # no query term occurs anywhere: fall back to the normalized statement sections
+            ranked = [cid for cid, chunk in self._chunks.items()
+                      if chunk["kind"] == "metrics" and (allowed is None or chunk["doc"] in allowed)]
+        if self.embed is not None and scores:
+            candidates = ranked[:k * 4]
+            q = np.asarray(self.embed(query), dtype="float64")
+            sims = {}
+            for cid in candidates:
+                v = self._embedding(cid)
+                denom = np.linalg.norm(q) * np.linalg.norm(v)
+                sims[cid] = float(q @ v / denom) if denom else 0.0
+            by_sim = {cid: rank for rank, cid in enumerate(sorted(candidates, key=lambda cid: -sims[cid]))}
+            # reciprocal rank fusion of the lexical and semantic rankings
+            fused = {cid: 1 / (60 + rank) + 1 / (60 + by_sim[cid]) for rank, cid in enumerate(candidates)}
+            ranked = sorted(candidates, key=lambda cid: -fused[cid])
+        return [self._chunks[cid] for cid in ranked[:k]]
+
+def fit_metric_table(table, question, max_tokens):
+    """
+    Cut a utils.format_metric_table TSV down to max_tokens: the header row plus the rows
+    whose label shares the most words with question (ties in table order), printed in
+    table order. Returns "" if the header and a single row do not fit.
+    """
+    header, *rows = table.split("\n")
+    words = set(tokenize(question))
+    relevance = [len(words & set(tokenize(row.split("\t", 1)[0]))) for row in rows]
+    used = estimate_tokens(header)
+    chosen = []
+    for pos in sorted(range(len(rows)), key=lambda pos: -relevance[pos]):
+        cost = estimate_tokens(rows[pos])
+        if used + cost > max_tokens:
+            continue
+        used += cost
+        chosen.append(pos)
+    if not chosen:
+        return ""
+    return "\n".join([header] + [rows[pos] for pos in sorted(chosen)])
+
+def select_context(index, question, token_budget=DEFAULT_TOKEN_BUDGET, docs=None, k=DEFAULT_TOP_K):
+    """
+    Prompt context from the top-k chunks for question within token_budget. A chunk that
+    would overflow the budget is skipped, except a metric table, which is cut down to its
+    rows most relevant to the question (fit_metric_table) so large sections still get in.
+    """
+    parts = []
+    used = 0
+    for chunk in index.search(question, k=k, docs=docs):
+        heading = f"[{chunk['doc']} - {chunk['kind']}: {chunk['title']}]"
+        block = f"{heading}\n{chunk['text']}"
+        cost = estimate_tokens(block)
+        if used + cost > token_budget:
+            if chunk["kind"] != "metrics":
+                continue
+            text = fit_metric_table(chunk["text"], question, token_budget - used - estimate_tokens(heading))
+            if not text:
+                continue
+            block = f"{heading}\n{text}"
+            cost = estimate_tokens(block)
+        parts.append(block)
+        used += cost
+    return "\n\n".join(parts)
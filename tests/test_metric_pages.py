@@ -0,0 +1,39 @@
+# tests/test_metric_pages.py
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from benchmarks.pipeline import make_pdf  # noqa: E402
+from doc_cache import ExtractionCache  # noqa: E402
+from metric_store import MetricStore  # noqa: E402
+from utils import extract_from_pdf, normalize_financial_data  # noqa: E402
+
+def test_metric_pages_reach_the_store(tmp_path):
+    path = str(tmp_path / "statements.pdf")
+    make_pdf(path, 3)
+    text, tables = extract_from_pdf(path)
+    metric_pages = {}
+    fin = normalize_financial_data(text, tables, metric_pages)
+    assert fin
+    assert metric_pages.keys() == fin.keys()
+    for section, metrics in fin.items():
+        assert metric_pages[section].keys() == metrics.keys()
+        assert all(isinstance(page, int) and page >= 1 for page in metric_pages[section].values())
+
+    store = MetricStore(str(tmp_path / "metrics.duckdb"))
+    store.write_document("doc", "statements.pdf", fin, "pdf", metric_pages)
+    assert store.load_financials({"doc": "doc"})["doc"] == fin
+    pages = store._query("SELECT DISTINCT section, metric_label, page FROM metrics")
+    assert pages["page"].notna().all()
+    for section, label, page in pages.itertuples(index=False):
+        assert page == metric_pages[section][label]
+
+def test_put_reports_evicted_keys(tmp_path):
+    cache = ExtractionCache(str(tmp_path))
+    assert cache.put("older", "text", [], {}, {}) == []
+    os.utime(tmp_path / "older", (0, 0))
+    # room for one entry only
+    cache.max_bytes = sum(e.stat().st_size for e in os.scandir(tmp_path / "older"))
+    assert cache.put("newer", "text", [], {}, {}) == ["older"]
+    assert cache.get("older") is None
+    assert cache.get("newer") == ("text", [], {}, {})
@@ -0,0 +1,19 @@
+# tests/test_page_objects.py
+import os
+import sys
+
+import pdfplumber
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import utils  # noqa: E402
+from benchmarks.pipeline import make_pdf  # noqa: E402
+
+@pytest.mark.skipif(not utils.LEAN_PAGE_OBJECTS, reason="lean object parsing is off for this pdfplumber release")
+def test_lean_page_objects_match_pdfplumber(tmp_path):
+    path = str(tmp_path / "statements.pdf")
+    make_pdf(path, 3)
+    with pdfplumber.open(path) as lean, pdfplumber.open(path) as stock:
+        for lean_page, stock_page in zip(lean.pages, stock.pages):
+            utils._parse_page_objects(lean_page)
+            assert lean_page.objects == stock_page.objects
@@ -0,0 +1,43 @@
+# tests/test_parse_numbers.py
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import utils  # noqa: E402
+
+# statement-style cells, including the awkward ones the table scan meets
+CELLS = [
+    "$1,234", "(5,678)", "12.5%", "-5%", "1.2M", "3k", "7 B", "M", "—", "", "abc", "3.4.5",
+    "-$7", " 42 ", "1e3", "2023", "FY2022", "(12)%", "$ (1,000.50)", "12 Bn", "%5", "-",
+    "+3", "0.5K%", "Q1 2023", "1,2,3", "$1.2B", "0", "-0.25", "(0.5)", "( 5)", "$(-5)",
+    "5.", ".5", "nan", "inf", "0.30000000000000004", None, float("nan"), 3.5, 7, 1e20,
+]
+
+def _same(expected, got):
+    if expected is None:
+        return np.isnan(got)
+    return expected == got or (np.isnan(expected) and np.isnan(got))
+
+def test_parse_number_array_agrees_with_clean_number_string():
+    got = utils.parse_number_array(CELLS)
+    assert got.dtype == np.float64
+    for cell, value in zip(CELLS, got):
+        assert _same(utils.clean_number_string(cell), value), cell
+
+def test_parse_number_array_keeps_shape():
+    block = np.array(CELLS[:12], dtype=object).reshape(3, 4)
+    got = utils.parse_number_array(block)
+    assert got.shape == (3, 4)
+    assert _same(utils.clean_number_string(block[1, 2]), got[1, 2])
+
+def test_parse_number_array_accepts_series():
+    got = utils.parse_number_array(pd.Series(["$1,234", "(5)", None]))
+    assert got[:2].tolist() == [1234.0, -5.0]
+    assert np.isnan(got[2])
+
+def test_parse_number_array_scale_units():
+    got = utils.parse_number_array(["1.2M", "(3k)", "7 B", "0.5K%", "$1,234", "12 Bn"], scale_units=True)
+    assert got.tolist() == [1.2e6, -3e3, 7e9, 500.0, 1234.0, 12.0]
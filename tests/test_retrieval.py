@@ -0,0 +1,28 @@
+# tests/test_retrieval.py
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from retrieval import RetrievalIndex, chunk_document, fit_metric_table, select_context  # noqa: E402
+from utils import estimate_tokens, format_metric_table  # noqa: E402
+
+def _large_section():
+    metrics = {f"line item {i}": {"2023": 1000.0 + i, "2022": 900.0 + i} for i in range(2000)}
+    metrics["total revenue"] = {"2023": 922402.0, "2022": 811000.0}
+    return {"Income Statement": metrics}
+
+def test_fit_metric_table_keeps_relevant_rows_within_budget():
+    table = format_metric_table(_large_section()["Income Statement"])
+    fitted = fit_metric_table(table, "What was total revenue in 2023?", 60)
+    lines = fitted.split("\n")
+    assert lines[0] == table.split("\n")[0]
+    assert "total revenue\t922K\t811K" in lines
+    assert len(lines) < 100
+    assert estimate_tokens(fitted) <= 60
+
+def test_select_context_truncates_an_oversized_metric_chunk():
+    index = RetrievalIndex()
+    index.add_document("book.xlsx", chunk_document("book.xlsx", "", [], _large_section()))
+    context = select_context(index, "What was total revenue in 2023?", token_budget=200)
+    assert "total revenue\t922K" in context
+    assert estimate_tokens(context) <= 200
@@ -1,9 +1,21 @@
 # utils.py
+import importlib.util
+import os
 import re
+import time
+import zipfile
 import pdfplumber
+from pdfminer.layout import LTAnno, LTChar, LTContainer
+try:
+    from pdfplumber.utils.pdfinternals import resolve_and_decode
+except ImportError:
+    # older pdfplumber releases; pages are then parsed by pdfplumber itself
+    resolve_and_decode = None
+import numpy as np
 import pandas as pd
 from io import BytesIO
 import openpyxl
+from concurrent.futures import ProcessPoolExecutor
 
 number_re = re.compile(r"[-+]?\$\s?[\d,]+(?:\.\d+)?|[-+]?\d[\d,]*(?:\.\d+)?")
 
@@ -31,6 +43,34 @@ def clean_number_string(s):
                 return None
         return None
 
+UNIT_SCALES = {"K": 1e3, "M": 1e6, "B": 1e9}
+unit_suffix_re = re.compile(r"(?i)([KMB])\s*%?\s*$")
+
+def _parse_number_cell(cell, scale_units=False):
+    val = clean_number_string(cell)
+    if val is None:
+        return np.nan
+    if scale_units:
+        m = unit_suffix_re.search(str(cell).replace(")", ""))
+        if m:
+            val *= UNIT_SCALES[m.group(1).upper()]
+    return val
+
+def parse_number_array(values, scale_units=False):
+    """
+    Column-level counterpart of clean_number_string. Takes a pandas Series or a NumPy
+    array (any shape) of cells and returns a float64 array of the same shape, with NaN
+    for cells that hold no number.
+    Handles "$", thousands separators, parenthesised negatives, a trailing "%" and a
+    K/M/B unit suffix. Like the scalar function the suffix is dropped, so both agree;
+    pass scale_units=True to multiply by 1e3/1e6/1e9 instead.
+    """
+    arr = np.asarray(values, dtype=object)
+    # cell by cell on purpose: the chain of pandas .str passes this replaced was slower
+    # than this loop at every size (see the numbers-* cases in benchmarks/pipeline.py)
+    out = np.array([_parse_number_cell(cell, scale_units) for cell in arr.ravel()], dtype="float64")
+    return out.reshape(arr.shape)
+
 def extract_numbers_from_text(text):
     found = number_re.findall(text or "")
     cleaned = []
@@ -40,43 +80,391 @@ def extract_numbers_from_text(text):
             cleaned.append(val)
     return cleaned
 
-def extract_from_pdf(path):
-    """Return (full_text, list_of_tables_as_dataframes). Uses pdfplumber to extract text and tables."""
-    text_parts = []
+def _as_source(source):
+    """
+    Accept a path, bytes/bytearray/memoryview or a binary file-like object (e.g. a
+    Streamlit upload) and return something pdfplumber and pandas can open directly.
+    Streams are rewound rather than copied.
+    """
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        return BytesIO(source)
+    if hasattr(source, "seek"):
+        source.seek(0)
+    return source
+
+def _source_for_workers(source):
+    """Paths are reopened by each worker; in-memory sources are shipped to them as bytes."""
+    if isinstance(source, (str, os.PathLike)):
+        return source
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        return bytes(source)
+    if hasattr(source, "getvalue"):
+        return source.getvalue()
+    source.seek(0)
+    return source.read()
+
+# documents shorter than this are always extracted serially
+PDF_PARALLEL_MIN_PAGES = 40
+
+def _char_object(page, obj, height, mb_x0, mb_top):
+    """pdfplumber's char dict for an LTChar, without Page.process_object's generic attribute walk."""
+    gs = obj.graphicstate
+    y0, y1 = obj.y0, obj.y1
+    top = (height - y1) + mb_top
+    char = {
+        "matrix": obj.matrix, "fontname": obj.fontname, "adv": obj.adv, "upright": obj.upright,
+        "x0": obj.x0 + mb_x0 if mb_x0 else obj.x0, "y0": y0,
+        "x1": obj.x1 + mb_x0 if mb_x0 else obj.x1, "y1": y1,
+        "width": obj.width, "height": obj.height, "size": obj.size, "mcid": obj.mcid, "tag": obj.tag,
+        "object_type": "char", "page_number": page.page_number, "ncs": resolve_and_decode(obj.ncs.name),
+        "text": obj.get_text(),
+        "stroking_color": gs.scolor if isinstance(gs.scolor, tuple) else (gs.scolor,),
+        "non_stroking_color": gs.ncolor if isinstance(gs.ncolor, tuple) else (gs.ncolor,),
+        "top": top, "bottom": (height - y0) + mb_top, "doctop": page.initial_doctop + top,
+    }
+    return char
+
+# _char_object reproduces the char dicts of this pdfplumber minor release only (checked
+# against 0.11); it relies on private internals, so any other release, newer ones
+# included, parses pages the stock way until it has been checked too
+LEAN_OBJECTS_PDFPLUMBER = (0, 11)
+
+def _lean_objects_supported():
+    version = tuple(int(p) for p in re.findall(r"\d+", pdfplumber.__version__)[:2])
+    return resolve_and_decode is not None and version == LEAN_OBJECTS_PDFPLUMBER
+
+LEAN_PAGE_OBJECTS = _lean_objects_supported()
+
+def _parse_page_objects(page):
+    """
+    Parse the page layout into pdfplumber's object dicts once, for both extract_text and
+    find_tables. Characters, nearly all of a page's objects, skip the generic per-attribute
+    conversion; every other object still goes through page.process_object. The result is
+    installed as the page's object cache, which pdfplumber itself does for filtered pages.
+    On other pdfplumber versions, or if anything unexpected comes up, the page is left
+    alone and pdfplumber parses it as usual.
+    """
+    if not LEAN_PAGE_OBJECTS or hasattr(page, "_objects"):
+        return
+    if getattr(page.pdf, "laparams", None) is not None or getattr(page.pdf, "unicode_norm", None) is not None:
+        return
+    try:
+        height = page.height
+        mb_x0, mb_top = page.mediabox[:2]
+        objects = {}
+        stack = [iter(page.layout._objs)]
+        while stack:
+            obj = next(stack[-1], None)
+            if obj is None:
+                stack.pop()
+            elif isinstance(obj, LTChar):
+                objects.setdefault("char", []).append(_char_object(page, obj, height, mb_x0, mb_top))
+            elif isinstance(obj, LTContainer):
+                stack.append(iter(obj._objs))
+            elif not isinstance(obj, LTAnno):
+                attr = page.process_object(obj)
+                objects.setdefault(attr["object_type"], []).append(attr)
+    except AttributeError:
+        return
+    page._objects = objects
+
+# ruled pages with fewer numbers than this in their text are not searched for tables
+PDF_TABLE_MIN_NUMBERS = 4
+
+def _table_check(page, txt):
+    """Cheap guess whether a page holds a statement table: (search it?, reason)."""
+    # extract_table's default "lines" strategy only builds cells from ruling lines and rectangle edges
+    if not (page.lines or page.rects or page.curves):
+        return False, "no ruling lines"
+    if len(number_re.findall(txt or "")) < PDF_TABLE_MIN_NUMBERS:
+        return False, "too few numbers"
+    return True, "ruled, numeric"
+
+def _extract_page(page, table_filter=True):
+    """
+    Return (text, tables, table_check) for a single pdfplumber page. table_check is
+    {"searched", "reason", "seconds"}: whether the page was searched for tables, why,
+    and the time spent on the table step. With table_filter=False every page is searched.
+    """
+    _parse_page_objects(page)
+    txt = page.extract_text()
     tables = []
-    with pdfplumber.open(path) as pdf:
-        for page in pdf.pages:
-            txt = page.extract_text()
-            if txt:
-                text_parts.append(txt)
-            # try to extract table(s)
+    start = time.perf_counter()
+    searched, reason = _table_check(page, txt) if table_filter else (True, "filter off")
+    # every table on the page, in reading order; find_tables works from the chars and
+    # edges extract_text already parsed, which pdfplumber keeps cached on the page
+    if searched:
+        try:
+            found = page.find_tables()
+        except Exception:
+            found = []
+        for table in found:
             try:
-                tbl = page.extract_table()
-                if tbl:
-                    # convert to dataframe
-                    df = pd.DataFrame(tbl[1:], columns=tbl[0])
-                    tables.append(df)
+                tbl = table.extract()
             except Exception:
-                pass
+                continue
+            if tbl:
+                # convert to dataframe
+                tables.append(pd.DataFrame(tbl[1:], columns=tbl[0]))
+    return txt, tables, {"searched": searched, "reason": reason, "seconds": time.perf_counter() - start}
+
+def _release_page(page):
+    # drop pdfplumber's per-page object/layout caches once a page has been extracted
+    if hasattr(page, "close"):
+        page.close()
+    else:
+        page.flush_cache()
+
+def _page_record(page, table_filter=True):
+    txt, tables, table_check = _extract_page(page, table_filter)
+    _release_page(page)
+    # the page travels with each table (attrs survive pickling) so metrics can cite it
+    for df in tables:
+        df.attrs["page"] = page.page_number
+    return {"page": page.page_number, "text": txt, "tables": tables, "table_check": table_check}
+
+def _iter_pages(pdf, start=0, stop=None, table_filter=True):
+    for page in pdf.pages[start:stop]:
+        yield _page_record(page, table_filter)
+
+def iter_pdf_pages(source, start=0, stop=None, table_filter=True):
+    """
+    Generator variant of extract_from_pdf: yields one record per page,
+    {"page": 1-based page number, "text": page text or None, "tables": [DataFrame, ...],
+     "table_check": {"searched", "reason", "seconds"}},
+    releasing each page's caches as it goes so memory stays bounded on long filings.
+    Feed the records to normalize_financial_pages to normalize incrementally.
+    """
+    with pdfplumber.open(_as_source(source)) as pdf:
+        yield from _iter_pages(pdf, start, stop, table_filter)
+
+# the document a page-range worker extracts from, set once per worker process
+_worker_pdf_source = None
+
+def _init_pdf_worker(source):
+    global _worker_pdf_source
+    _worker_pdf_source = source
+
+def _extract_pdf_page_range(start, stop, table_filter=True):
+    """Process pool worker: open the worker's PDF and extract pages [start, stop)."""
+    return list(iter_pdf_pages(_worker_pdf_source, start, stop, table_filter))
+
+def _extract_pdf_parallel(source, n_pages, workers, table_filter=True):
+    # a few ranges per worker so one slow range does not hold up the whole pool
+    n_chunks = min(n_pages, workers * 4)
+    bounds = [n_pages * i // n_chunks for i in range(n_chunks + 1)]
+    # the document goes to each worker once, not with every page range
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_pdf_worker,
+                             initargs=(_source_for_workers(source),)) as pool:
+        chunks = pool.map(_extract_pdf_page_range, bounds[:-1], bounds[1:], [table_filter] * n_chunks)
+        # map yields in submission order, so pages come back in document order
+        return [page for chunk in chunks for page in chunk]
+
+# page titles that send a page through pdfplumber in fast-scan mode
+STATEMENT_PAGE_TITLES = [
+    "income statement", "statement of operations", "statements of operations", "profit and loss",
+    "statement of income", "statements of income", "comprehensive income", "balance sheet",
+    "statement of financial position", "cash flow", "cash flows",
+]
+statement_title_re = re.compile("|".join(re.escape(t) for t in STATEMENT_PAGE_TITLES))
+# untitled pages qualify with this many different statement line items (multi-word metric keywords)
+STATEMENT_PAGE_MIN_ITEMS = 2
+
+def _pdfium_available():
+    # pypdfium2 comes with recent pdfplumber releases but is not guaranteed
+    return importlib.util.find_spec("pypdfium2") is not None
+
+def _pdfium_page_texts(source):
+    """Raw text of every page from pdfium, without any layout analysis."""
+    import pypdfium2 as pdfium
+    pdf = pdfium.PdfDocument(_as_source(source))
+    try:
+        texts = []
+        for page in pdf:
+            textpage = page.get_textpage()
+            texts.append(textpage.get_text_range().replace("\r\n", "\n"))
+            textpage.close()
+            page.close()
+        return texts
+    finally:
+        pdf.close()
+
+def is_statement_page(text):
+    """
+    Fast-scan test: enough numbers to hold a statement table, plus a statement title or
+    several distinct statement line items (e.g. "total assets" and "total liabilities").
+    """
+    lower = (text or "").lower()
+    if len(number_re.findall(lower)) < PDF_TABLE_MIN_NUMBERS:
+        return False
+    if statement_title_re.search(lower):
+        return True
+    items = {kw for _, _, metric_keywords in STATEMENT_SECTIONS for kw in metric_keywords if " " in kw and kw in lower}
+    return len(items) >= STATEMENT_PAGE_MIN_ITEMS
+
+def _extract_pdf_fast(source, table_filter=True):
+    """Fast-scan page records: pdfium text for every page, pdfplumber only on statement pages."""
+    texts = _pdfium_page_texts(source)
+    pages = []
+    with pdfplumber.open(_as_source(source)) as pdf:
+        for i, text in enumerate(texts):
+            if is_statement_page(text):
+                pages.append(_page_record(pdf.pages[i], table_filter))
+            else:
+                pages.append({"page": i + 1, "text": text, "tables": [],
+                              "table_check": {"searched": False, "reason": "fast scan: not a statement page", "seconds": 0.0}})
+    return pages
+
+def extract_from_pdf(source, workers=1, parallel_min_pages=PDF_PARALLEL_MIN_PAGES, table_filter=True, page_log=None,
+                     fast_scan=False):
+    """
+    Return (full_text, list_of_tables_as_dataframes). Uses pdfplumber to extract text and tables.
+    source is a path, bytes/memoryview or a binary file-like object.
+    With workers > 1 (None = one per CPU), documents with at least parallel_min_pages pages
+    are split into page ranges extracted by a process pool and merged back in page order.
+    Only pages with ruling lines and some numbers are searched for tables (table_filter);
+    pass a list as page_log to get each page's {"page", "searched", "reason", "seconds"}.
+    With fast_scan (and pypdfium2 installed), every page's text comes from pdfium and only
+    pages with a statement title (is_statement_page) go through pdfplumber for text and tables.
+    """
+    if workers is None:
+        workers = os.cpu_count() or 1
+    if fast_scan and _pdfium_available():
+        pages = _extract_pdf_fast(source, table_filter)
+    else:
+        with pdfplumber.open(_as_source(source)) as pdf:
+            n_pages = len(pdf.pages)
+            if workers > 1 and n_pages >= parallel_min_pages:
+                pages = None
+            else:
+                pages = list(_iter_pages(pdf, table_filter=table_filter))
+        if pages is None:
+            pages = _extract_pdf_parallel(source, n_pages, workers, table_filter)
+    if page_log is not None:
+        page_log.extend({"page": page["page"], **page["table_check"]} for page in pages)
+    text_parts = [page["text"] for page in pages if page["text"]]
+    tables = [df for page in pages for df in page["tables"]]
     full_text = "\n".join(text_parts)
     return full_text, tables
 
-def extract_from_excel(path):
-    """Return (concatenated_text, list_of_tables). Uses pandas read_excel to parse sheets."""
+# pandas engine per workbook format when python-calamine is not installed
+EXCEL_ENGINES = {"xlsx": "openpyxl", "xls": "xlrd", "xlsb": "pyxlsb"}
+
+def _peek(source, n):
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        return bytes(source[:n])
+    if hasattr(source, "read"):
+        source.seek(0)
+        head = source.read(n)
+        source.seek(0)
+        return head
+    with open(source, "rb") as f:
+        return f.read(n)
+
+def detect_excel_format(source):
+    """Return "xlsx" (also xlsm), "xlsb" or "xls" from the file's magic bytes."""
+    head = _peek(source, 8)
+    if head.startswith(b"\xd0\xcf\x11\xe0"):
+        # OLE2 compound document: legacy BIFF workbook
+        return "xls"
+    if head.startswith(b"PK"):
+        # both xlsx and xlsb are zip containers; xlsb keeps a binary workbook part
+        try:
+            with zipfile.ZipFile(_as_source(source)) as zf:
+                return "xlsb" if "xl/workbook.bin" in zf.namelist() else "xlsx"
+        except zipfile.BadZipFile:
+            pass
+    name = source if isinstance(source, (str, os.PathLike)) else getattr(source, "name", "")
+    ext = os.path.splitext(str(name))[1].lower()
+    return {".xls": "xls", ".xlsb": "xlsb"}.get(ext, "xlsx")
+
+def _calamine_available():
+    # pandas reads through python-calamine from 2.2 on
+    pandas_version = tuple(int(p) for p in re.findall(r"\d+", pd.__version__)[:2])
+    return pandas_version >= (2, 2) and importlib.util.find_spec("python_calamine") is not None
+
+def select_excel_engine(fmt):
+    """Pick the read_excel engine for a detect_excel_format result: calamine when installed (reads every format)."""
+    if _calamine_available():
+        return "calamine"
+    return EXCEL_ENGINES[fmt]
+
+# rows read from each sheet to classify it and to build the text preview
+EXCEL_PREVIEW_ROWS = 20
+
+def list_excel_sheets(source, preview_rows=EXCEL_PREVIEW_ROWS):
+    """
+    List the sheets of an xlsx/xlsm workbook without loading them, using openpyxl in
+    read-only mode. Returns [{"name", "rows", "cols", "preview", "financial"}, ...] where
+    preview holds the first preview_rows rows and financial tells whether the sheet name
+    or those rows mention statement keywords.
+    """
+    keywords = set()
+    for _, text_keywords, metric_keywords in STATEMENT_SECTIONS:
+        keywords.update(text_keywords)
+        keywords.update(metric_keywords)
+    wb = openpyxl.load_workbook(_as_source(source), read_only=True, data_only=True)
     try:
-        xl = pd.read_excel(path, sheet_name=None, header=None)
-    except Exception as e:
-        # try with engine openpyxl
-        xl = pd.read_excel(path, sheet_name=None, header=None, engine="openpyxl")
+        sheets = []
+        for ws in wb.worksheets:
+            preview = list(ws.iter_rows(max_row=preview_rows, values_only=True))
+            probe = " ".join([ws.title] + [str(v) for row in preview for v in row if v is not None])
+            sheets.append({
+                "name": ws.title,
+                "rows": ws.max_row,
+                "cols": ws.max_column,
+                "preview": preview,
+                "financial": find_keywords_in_text(probe, keywords),
+            })
+        return sheets
+    finally:
+        wb.close()
+
+def extract_from_excel(source, sheets="all"):
+    """
+    Return (concatenated_text, list_of_tables). Uses pandas read_excel to parse sheets.
+    source is a path, bytes/memoryview or a binary file-like object.
+    The engine is chosen once from the file's magic bytes (see detect_excel_format).
+    With sheets="financial", xlsx/xlsm workbooks are probed with list_excel_sheets and only
+    sheets that look like financial statements are fully loaded; the others contribute
+    a preview of their first rows to the text and no table. Workbooks the probe cannot
+    read are loaded in full.
+    """
+    fmt = detect_excel_format(source)
+    engine = select_excel_engine(fmt)
+    if sheets == "financial" and fmt == "xlsx":
+        try:
+            infos = list_excel_sheets(source)
+        except Exception:
+            # openpyxl's read-only mode rejected the workbook: load every sheet
+            infos = None
+        if infos is not None:
+            return _extract_excel_sheets(source, infos, engine)
+    xl = pd.read_excel(_as_source(source), sheet_name=None, header=None, engine=engine)
     texts = []
     tables = []
     for sheet_name, df in xl.items():
         # record a CSV preview
-        texts.append(f"Sheet: {sheet_name}\n{df.head(20).to_string()}")
+        texts.append(f"Sheet: {sheet_name}\n{df.head(EXCEL_PREVIEW_ROWS).to_string()}")
         # store the dataframe as a table if it looks like numeric
         tables.append(df)
     return "\n\n".join(texts), tables
 
+def _extract_excel_sheets(source, infos, engine):
+    wanted = [info["name"] for info in infos if info["financial"]]
+    xl = pd.read_excel(_as_source(source), sheet_name=wanted, header=None, engine=engine) if wanted else {}
+    texts = []
+    tables = []
+    for info in infos:
+        if info["financial"]:
+            df = xl[info["name"]]
+            texts.append(f"Sheet: {info['name']}\n{df.head(EXCEL_PREVIEW_ROWS).to_string()}")
+            tables.append(df)
+        else:
+            preview = pd.DataFrame(info["preview"]).to_string()
+            texts.append(f"Sheet: {info['name']} (preview only, {info['rows']} rows)\n{preview}")
+    return "\n\n".join(texts), tables
+
 def find_keywords_in_text(text, keywords):
     text_low = (text or "").lower()
     for k in keywords:
@@ -84,127 +472,327 @@ def find_keywords_in_text(text, keywords):
             return True
     return False
 
-def normalize_financial_data(text, tables):
+# (section name, text keywords that enable the section, row-label keywords)
+STATEMENT_SECTIONS = [
+    ("Income Statement",
+     ["income statement", "statement of operations", "profit and loss", "revenue"],
+     ["revenue", "net income", "gross profit", "operating income", "total revenue", "profit"]),
+    ("Balance Sheet",
+     ["balance sheet", "assets", "liabilities", "equity"],
+     ["total assets", "total liabilities", "shareholders' equity", "equity"]),
+    ("Cash Flow",
+     ["cash flow", "cash flows", "net cash", "cash and cash equivalents"],
+     ["net cash provided", "net cash", "cash flows from operating", "cash and cash equivalents"]),
+]
+FALLBACK_SECTION = "Extracted"
+FALLBACK_KEYWORDS = ["revenue", "net income", "total assets"]
+
+def normalize_financial_data(text, tables, metric_pages=None):
     """
     Attempt to detect Income Statement, Balance Sheet, Cash Flow patterns and extract
     key metrics into a structured dict:
     { "Income Statement": { period1: {"Revenue": val, "Net Income": val,...}, ... }, ... }
     This is heuristic: it looks for keywords and numeric columns.
+    Pass a dict as metric_pages to get {section: {label: page}} alongside, the page being
+    that of the PDF table the figures came from (None for spreadsheets).
     """
-    result = {}
-    # Heuristic: search for statement keywords in text
-    if find_keywords_in_text(text, ["income statement", "statement of operations", "profit and loss", "revenue"]):
-        # parse tables for revenue/net income keywords
-        is_fin = extract_metrics_from_tables(tables, ["revenue", "net income", "gross profit", "operating income", "total revenue", "profit"])
-        if is_fin:
-            result["Income Statement"] = is_fin
-    if find_keywords_in_text(text, ["balance sheet", "assets", "liabilities", "equity"]):
-        bs = extract_metrics_from_tables(tables, ["total assets", "total liabilities", "shareholders' equity", "equity"])
-        if bs:
-            result["Balance Sheet"] = bs
-    if find_keywords_in_text(text, ["cash flow", "cash flows", "net cash", "cash and cash equivalents"]):
-        cf = extract_metrics_from_tables(tables, ["net cash provided", "net cash", "cash flows from operating", "cash and cash equivalents"])
-        if cf:
-            result["Cash Flow"] = cf
+    return normalize_financial_pages([{"text": text, "tables": tables}], metric_pages)
 
+def normalize_financial_pages(pages, metric_pages=None):
+    """
+    Incremental normalize_financial_data over page records such as those yielded by
+    iter_pdf_pages ({"text": ..., "tables": [...]}). Each page is consumed and dropped
+    as it arrives; the result equals normalize_financial_data on the joined text and tables.
+    """
+    section_keywords = {name: metric_keywords for name, _, metric_keywords in STATEMENT_SECTIONS}
     # fallback: try to find common metric names anywhere in tables
-    fallback = extract_metrics_from_tables(tables, ["revenue", "net income", "total assets"])
-    if fallback and not result:
-        result["Extracted"] = fallback
+    section_keywords[FALLBACK_SECTION] = FALLBACK_KEYWORDS
+    any_pattern, section_patterns = _section_patterns(section_keywords)
+    found = {name: {} for name in section_keywords}
+    found_pages = {name: {} for name in section_keywords}
+    # Heuristic: search for statement keywords in text, scan the tables once for all sections
+    text_hits = set()
+    for page in pages:
+        for name, text_keywords, _ in STATEMENT_SECTIONS:
+            if name not in text_hits and find_keywords_in_text(page["text"], text_keywords):
+                text_hits.add(name)
+        for df in page["tables"]:
+            try:
+                _scan_table_metrics(df, any_pattern, section_patterns, found, found_pages)
+            except Exception:
+                continue
 
+    result = {}
+    for name, _, _ in STATEMENT_SECTIONS:
+        if name in text_hits and found[name]:
+            result[name] = found[name]
+    if found[FALLBACK_SECTION] and not result:
+        result[FALLBACK_SECTION] = found[FALLBACK_SECTION]
+    if metric_pages is not None:
+        metric_pages.update({name: found_pages[name] for name in result})
     return result
 
 def extract_metrics_from_tables(tables, metric_keywords):
     """
     Look for metric keywords in row labels of tables. Return mapping of detected metrics per period if possible.
     """
-    metrics = {}
+    return extract_section_metrics(tables, {None: metric_keywords})[None]
+
+def _keyword_pattern(keywords):
+    # longest first so the alternation prefers the most specific keyword
+    keywords = sorted({k.lower() for k in keywords}, key=len, reverse=True)
+    return re.compile("|".join(re.escape(k) for k in keywords)) if keywords else None
+
+def extract_section_metrics(tables, section_keywords):
+    """
+    Single-pass version of extract_metrics_from_tables for several sections at once.
+    section_keywords maps section name -> row-label keywords. Every table is normalized
+    once and every row is matched against all sections in one scan.
+    Returns {section name: metrics dict or None}, each value identical to what
+    extract_metrics_from_tables(tables, keywords) returns for that section.
+    """
+    any_pattern, section_patterns = _section_patterns(section_keywords)
+    found = {name: {} for name in section_keywords}
     for df in tables:
         try:
-            # convert all to string
-            df2 = df.copy()
-            df2 = df2.fillna("").astype(str)
-            # try find header columns that look like years or periods
-            header_like = []
-            # If first row contains years (like 2023, 2022)
-            possible_header = df2.iloc[0].tolist()
-            for j, v in enumerate(possible_header):
-                if re.search(r"20\d{2}|FY|Q[1-4]", v):
-                    header_like.append((j, v))
-            # If header_like found, then rows probably metrics
-            for idx in range(df2.shape[0]):
-                row0 = df2.iloc[idx,0].lower() if df2.shape[1] > 0 else ""
-                for kw in metric_keywords:
-                    if kw.lower() in row0:
-                        # collect row numbers across columns
-                        row_vals = {}
-                        for col in range(1, df2.shape[1]):  # assume first col labels, rest numeric
-                            heading = df2.iloc[0, col] if df2.shape[0] > 0 else f"col{col}"
-                            val_raw = df2.iloc[idx, col]
-                            val = clean_number_string(val_raw)
-                            if val is not None:
-                                key = str(heading).strip()
-                                row_vals[key] = val
-                        metrics[row0.strip()] = row_vals
+            _scan_table_metrics(df, any_pattern, section_patterns, found)
         except Exception:
             continue
-    return metrics if metrics else None
+    return {name: (metrics if metrics else None) for name, metrics in found.items()}
+
+def _section_patterns(section_keywords):
+    """Compile one pattern over every keyword plus one per section (sections without keywords are dropped)."""
+    any_pattern = _keyword_pattern(k for kws in section_keywords.values() for k in kws)
+    section_patterns = []
+    for name, keywords in section_keywords.items():
+        pattern = _keyword_pattern(keywords)
+        if pattern is not None:
+            section_patterns.append((name, pattern))
+    return any_pattern, section_patterns
+
+# tables with fewer rows than this are scanned row by row: each pandas string op has a
+# fixed cost that only pays off on tall tables such as workbook sheets
+SCAN_VECTORIZED_MIN_ROWS = 200
+
+def _scan_table_metrics(df, any_pattern, section_patterns, found, found_pages=None):
+    """
+    Add the rows of one table whose label matches a section pattern to found[section],
+    and the table's page (df.attrs["page"], if any) to found_pages[section].
+    """
+    # convert all to string
+    df2 = df.fillna("").astype(str)
+    n_rows, n_cols = df2.shape
+    # first row holds the period headings; an empty table raises here and is skipped
+    headings = [str(df2.iloc[0, col]).strip() for col in range(1, n_cols)]
+    if n_cols == 0 or any_pattern is None:
+        return
+    if n_rows < SCAN_VECTORIZED_MIN_ROWS:
+        rows = df2.to_numpy()
+        labels = [label.lower() for label in rows[:, 0]]
+        hits = [pos for pos, label in enumerate(labels) if any_pattern.search(label)]
+        if not hits:
+            return
+        labels = [labels[pos] for pos in hits]
+        row_vals = []
+        for pos in hits:
+            vals = {}
+            for col, cell in enumerate(rows[pos, 1:]):
+                val = clean_number_string(cell)
+                if val is not None and val == val:
+                    vals[headings[col]] = val
+            row_vals.append(vals)
+    else:
+        lowered = df2.iloc[:, 0].str.lower()
+        hits = lowered.str.contains(any_pattern).to_numpy(dtype=bool)
+        if not hits.any():
+            return
+        labels = lowered[hits].tolist()
+        # convert the numeric cells of the matched rows in one go; first col labels, rest numeric
+        values = parse_number_array(df2.iloc[hits, 1:].to_numpy())
+        row_vals = [{headings[col]: float(val) for col, val in enumerate(row) if val == val} for row in values]
+    # only the rows that matched some keyword are checked against each section
+    for label, vals in zip(labels, row_vals):
+        key = label.strip()
+        for name, pattern in section_patterns:
+            if pattern.search(label):
+                found[name][key] = dict(vals)
+                if found_pages is not None:
+                    found_pages[name][key] = df.attrs.get("page")
 
-def build_document_summary_text(extracted_data):
-    """Return a compact text summary of extracted_data suitable to send to an LLM."""
-    parts = []
+def financials_frame(financials):
+    """normalize_financial_data's dict as a DataFrame: one row per (section, metric), one column per period."""
+    rows = []
+    for section, metrics in financials.items():
+        for label, values in metrics.items():
+            rows.append({"section": section, "metric": label, **{str(p): v for p, v in values.items()}})
+    return pd.DataFrame(rows)
+
+# scale suffixes for prompt numbers, largest first
+SUMMARY_UNITS = [(1e9, "B"), (1e6, "M"), (1e3, "K")]
+
+def estimate_tokens(text):
+    """Rough LLM token count (~4 characters per token), enough for budgeting."""
+    return len(text) // 4 + 1
+
+def format_summary_value(value):
+    """Round a metric value to 3 significant digits with a K/M/B suffix, e.g. 922402.0 -> 922K."""
+    if value is None or (isinstance(value, float) and np.isnan(value)):
+        return ""
+    if not isinstance(value, (int, float)):
+        return str(value)
+    scale, suffix = next(((s, x) for s, x in SUMMARY_UNITS if abs(value) >= s), (1, ""))
+    if abs(float(f"{value / scale:.3g}")) >= 1000:
+        # e.g. 999,950 rounds up to 1000K: step up to the next unit, or print the
+        # whole number when there is none
+        larger = [(s, x) for s, x in SUMMARY_UNITS if s > scale]
+        if not larger:
+            return f"{value / scale:.0f}{suffix}"
+        scale, suffix = larger[-1]
+    return f"{value / scale:.3g}{suffix}"
+
+def _label_key(label):
+    return " ".join(str(label).lower().split())
+
+def format_metric_table(metrics):
+    """
+    TSV table of one section's metrics: one row per label (case/space duplicates dropped),
+    one column per period in first-seen order, values rounded and unit-scaled.
+    """
+    rows = {}
+    for label, values in metrics.items():
+        key = _label_key(label)
+        if key not in rows:
+            rows[key] = (label, values if isinstance(values, dict) else {"": values})
+    periods = list(dict.fromkeys(str(p) for _, values in rows.values() for p in values))
+    lines = ["\t".join(["metric"] + periods)]
+    for label, values in rows.values():
+        by_period = {str(p): v for p, v in values.items()}
+        lines.append("\t".join([str(label)] + [format_summary_value(by_period.get(p)) for p in periods]))
+    return "\n".join(lines)
+
+# metric words simple_qa_answer looks for, in priority order
+QA_METRICS = ["revenue", "net income", "net loss", "profit", "total assets", "cash", "operating income", "gross profit"]
+# every (possibly overlapping) year in a period heading, plus fiscal tokens
+period_year_re = re.compile(r"(?=(20\d{2}))")
+period_fiscal_re = re.compile(r"fy|q[1-4]")
+# fiscal tokens in a question must start a word ("identify" is not FY)
+question_fiscal_re = re.compile(r"\b(fy|q[1-4])")
+
+def build_metric_index(extracted_data):
+    """
+    Build the inverted index simple_qa_answer uses instead of scanning every document:
+    {"docs": {fname: upload position}, "next_position": int,
+     "metrics": {qa metric: {fname: [posting, ...]}}}
+    A posting is {"section", "label", "first": (period, value),
+    "by_period": {token: (period, value)}} for a label containing the metric and having
+    at least one period, in the document's section/label order. Tokens are the years and
+    fiscal tokens (fy, q1..q4) of each period heading, and each "fiscal year" pair, so
+    "Q3 2023" is indexed under "2023", "q3" and "q3 2023".
+    """
+    index = {"docs": {}, "next_position": 0, "metrics": {m: {} for m in QA_METRICS}}
     for fname, sections in extracted_data.items():
-        parts.append(f"Document: {fname}")
-        for secname, metrics in sections.items():
-            parts.append(f"Section: {secname}")
-            if isinstance(metrics, dict):
-                for metric_label, values in metrics.items():
-                    parts.append(f"- {metric_label}: {values}")
-            else:
-                parts.append(str(metrics))
-    return "\n".join(parts)
+        add_document_to_index(index, fname, sections)
+    return index
 
-def simple_qa_answer(question, extracted_data, selected_doc="all"):
+def add_document_to_index(index, fname, sections):
+    """Index (or re-index) one document in place; a re-indexed document keeps its position."""
+    remove_document_from_index(index, fname, keep_position=True)
+    if fname not in index["docs"]:
+        index["docs"][fname] = index["next_position"]
+        index["next_position"] += 1
+    for secname, metrics in (sections or {}).items():
+        if not isinstance(metrics, dict):
+            continue
+        for label, periods in metrics.items():
+            if not periods:
+                continue
+            posting = None
+            for m in QA_METRICS:
+                if m not in label:
+                    continue
+                if posting is None:
+                    posting = {"section": secname, "label": label, "first": next(iter(periods.items())), "by_period": {}}
+                    for k, v in periods.items():
+                        key = str(k).lower()
+                        years = period_year_re.findall(key)
+                        fiscal = period_fiscal_re.findall(key)
+                        for token in years + fiscal + [f"{f} {y}" for f in fiscal for y in years]:
+                            posting["by_period"].setdefault(token, (k, v))
+                index["metrics"][m].setdefault(fname, []).append(posting)
+
+def remove_document_from_index(index, fname, keep_position=False):
+    """Drop a document's postings (and, unless keep_position, its place in the upload order)."""
+    for postings in index["metrics"].values():
+        postings.pop(fname, None)
+    if not keep_position:
+        index["docs"].pop(fname, None)
+
+def lookup_metric(index, metric, docs=None):
+    """Return (fname, postings) for the first document (in upload order) with the metric, or None."""
+    by_doc = index["metrics"].get(metric, {})
+    candidates = by_doc if docs is None else [d for d in docs if d in by_doc]
+    if not candidates:
+        return None
+    fname = min(candidates, key=index["docs"].__getitem__)
+    return fname, by_doc[fname]
+
+def simple_qa_answer(question, extracted_data, selected_doc="all", index=None):
     """
     A simple rule-based QA:
     - parse question for metric words (revenue, profit, net income, assets)
-    - parse for year (e.g., 2023) or 'latest'
-    - look into extracted_data and return value if found
+    - parse for year (e.g., 2023), quarter or fiscal year (Q3, FY) or 'latest'
+    - look up the metric in the index (build_metric_index(extracted_data) if not given)
     Returns (answer_text, confidence_float 0..1)
     """
     q = question.lower()
-    metrics_candidates = ["revenue", "net income", "net loss", "profit", "total assets", "cash", "operating income", "gross profit"]
     metric = None
-    for m in metrics_candidates:
+    for m in QA_METRICS:
         if m in q:
             metric = m
             break
     year_match = re.search(r"(20\d{2})", q)
     year = year_match.group(1) if year_match else None
+    fiscal_match = question_fiscal_re.search(q)
+    fiscal = fiscal_match.group(1) if fiscal_match else None
     latest = "latest" in q or "most recent" in q or ("last" in q and re.search(r"last (year|quarter|q[1-4])", q))
 
     # select docs
     docs = extracted_data if selected_doc == "all" else {selected_doc: extracted_data.get(selected_doc, {})}
-    # search
-    for fname, sections in docs.items():
-        for secname, metrics in sections.items():
-            # metrics is dict: labels -> {period: value}
-            if isinstance(metrics, dict):
-                for label, periods in metrics.items():
-                    if metric and metric in label:
-                        # if year asked, try to find key with that year
-                        if year:
-                            for k, v in periods.items():
-                                if year in str(k):
-                                    return f"{label} for {year} is {v}", 0.9
-                        # else latest: choose highest-order key or first
-                        if latest:
-                            # pick the first numeric found
-                            for k, v in periods.items():
-                                return f"{label} (most recent found: {k}) = {v}", 0.8
-                        # else try any match
-                        for k, v in periods.items():
-                            return f"{label} ({k}) = {v}", 0.7
+    if index is None:
+        index = build_metric_index(docs)
+    found = lookup_metric(index, metric, None if selected_doc == "all" else [selected_doc]) if metric else None
+    if found:
+        # the first labelled row with the metric decides the answer
+        posting = found[1][0]
+        label = posting["label"]
+        # if a period was asked, try the most specific key first: "q3 2023", then the
+        # quarter alone; a plain year only answers year and FY questions
+        tokens = []
+        if fiscal and year:
+            tokens.append(f"{fiscal} {year}")
+        elif fiscal:
+            tokens.append(fiscal)
+        if year and fiscal in (None, "fy"):
+            tokens.append(year)
+        for token in tokens:
+            if token in posting["by_period"]:
+                k, v = posting["by_period"][token]
+                return f"{label} for {year if token == year else k} is {v}", 0.9
+        if fiscal and fiscal != "fy":
+            # no column for the quarter asked about: offer the year's (or the first) figure,
+            # but below the 0.6 the app needs to skip the LLM, which may find the quarter
+            missing = f"no {fiscal.upper()} figure found"
+            if year and year in posting["by_period"]:
+                k, v = posting["by_period"][year]
+                return f"{label} for {year} is {v} ({missing})", 0.5
+            k, v = posting["first"]
+            return f"{label} ({k}) = {v} ({missing})", 0.5
+        k, v = posting["first"]
+        # else latest: no ordering is known, so the first period found
+        if latest:
+            return f"{label} (most recent found: {k}) = {v}", 0.8
+        # else try any match
+        return f"{label} ({k}) = {v}", 0.7
     # fallback: try text search for dollar amounts
     for fname, sections in docs.items():
         text = ""
@@ -217,4 +805,4 @@ def simple_qa_answer(question, extracted_data, selected_doc="all"):
         if numbers:
             return f"I found numbers in the document but couldn't map them precisely to your question. Examples: {numbers[:5]}", 0.4
 
-    return "I couldn't find a precise answer in the extracted data.", 0.0
\ No newline at end of file
+    return "I couldn't find a precise answer in the extracted data.", 0.0